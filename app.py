@@ -1,15 +1,60 @@
+import time
+
+# Measured from the first import, so it covers every module the serving app pulls in
+_import_started_at = time.perf_counter()
+
+import asyncio
+import hmac
+import itertools
 from fastapi import FastAPI, Request
 from typing import Optional
 from uvicorn import run as app_run
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from shipment.utils.main_utils import MainUtils
 
+from shipment.components.admission_controller import AdmissionController, AdmissionMiddleware
+from shipment.components.arrow_codec import ARROW_STREAM_CONTENT_TYPE, import_pyarrow
+from shipment.components.batch_dispatcher import MicroBatchDispatcher
+from shipment.components.bulk_predictor import CSV_FORMAT, BulkPredictor
+from shipment.components.inference_pool import PROCESS_POOL, InferencePool
 from shipment.components.model_predictor import CostPredictor, shippingData
-from shipment.constant import APP_HOST, APP_PORT
-from shipment.pipeline.training_pipeline import TrainPipeline
+from shipment.components.model_warmup import ModelWarmup
+from shipment.components.prediction_cache import PredictionCache
+from shipment.components.request_validator import (
+    ShipmentValidationError,
+    ShipmentValidatorCache,
+    dumps_json,
+    loads_json,
+)
+from shipment.components.shadow_scorer import ShadowScorer
+from shipment.components.stack_profiler import StackProfiler
+from shipment.constant import (
+    APP_HOST,
+    APP_PORT,
+    ARROW_BATCH_MAX_BYTES,
+    DEBUG_PROFILE_TOKEN,
+    DEBUG_TOKEN_HEADER,
+    MODEL_VERSION_HEADER,
+    PREDICT_BATCH_MAX_SIZE,
+)
+from shipment.exception import (
+    AdmissionRejectedException,
+    ExplanationNotSupportedException,
+    InferenceQueueFullException,
+    InferenceTimeoutException,
+    ModelVersionNotFoundException,
+    ProfilerBusyException,
+)
+from shipment.pipeline.training_job import TrainingJobRunner
+from shipment.utils.metrics import PROMETHEUS_CONTENT_TYPE, REGISTRY, time_stage
+
+APP_IMPORT_SECONDS = REGISTRY.gauge(
+    "shipment_app_import_seconds", "Time taken to import the serving app and its dependencies"
+)
+APP_IMPORT_SECONDS.set(time.perf_counter() - _import_started_at)
 
 
 
@@ -20,6 +65,33 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 
 templates = Jinja2Templates(directory="templates")
 
+cost_predictor = CostPredictor()
+inference_pool = InferencePool(cost_predictor)
+bulk_predictor = BulkPredictor(inference_pool)
+batch_dispatcher = MicroBatchDispatcher(inference_pool)
+prediction_cache = PredictionCache()
+model_warmup = ModelWarmup(inference_pool)
+shadow_scorer = ShadowScorer()
+shipment_validators = ShipmentValidatorCache(
+    lambda pinned_version: inference_pool.run("get_categorical_domains", pinned_version)
+)
+admission_controller = AdmissionController()
+stack_profiler = StackProfiler()
+training_job_runner = TrainingJobRunner(on_success=inference_pool.reload_model)
+
+REQUESTS = REGISTRY.counter(
+    "shipment_requests_total", "HTTP requests by route, method and status code", ["route", "method", "status"]
+)
+REQUEST_ERRORS = REGISTRY.counter(
+    "shipment_request_errors_total", "Requests that failed with an error, by route", ["route"]
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "shipment_request_seconds", "End-to-end request latency by route", ["route"]
+)
+MODEL_INFO = REGISTRY.gauge(
+    "shipment_model_info", "Version (S3 ETag) of the model currently served", ["version"]
+)
+
 
 origins = ["*"]
 
@@ -33,6 +105,66 @@ app.add_middleware(
 
 
 
+@app.on_event("startup")
+async def startInference():
+    inference_pool.start()
+    await batch_dispatcher.start()
+    model_warmup.start()
+    shadow_scorer.start()
+
+
+@app.on_event("shutdown")
+async def stopInference():
+    await model_warmup.stop()
+    shadow_scorer.shutdown()
+    await batch_dispatcher.stop()
+    inference_pool.shutdown()
+
+
+
+def overloadResponse(e: Exception) -> JSONResponse:
+    # A full worker pool asks the client to back off, a pool timeout means the service is saturated
+    if isinstance(e, AdmissionRejectedException):
+        status_code, retry_after = e.status_code, e.retry_after
+    else:
+        status_code, retry_after = (429 if isinstance(e, InferenceQueueFullException) else 503), 1
+    return JSONResponse(
+        {"status": False, "error": f"{e}"},
+        status_code=status_code,
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+OVERLOAD_EXCEPTIONS = (InferenceQueueFullException, InferenceTimeoutException)
+
+
+
+# Added before the metrics middleware, so it runs inside it and shed requests are counted
+app.add_middleware(AdmissionMiddleware, admission_controller=admission_controller, reject=overloadResponse)
+
+
+
+@app.middleware("http")
+async def recordRequestMetrics(request: Request, call_next):
+    started_at = time.perf_counter()
+    response = await call_next(request)
+
+    # Using the route template so path parameters do not create a label per value, and a single label for
+    # every path no route matched so scanners cannot grow the label set
+    matched_route = request.scope.get("route")
+    if matched_route is not None:
+        route = matched_route.path
+    elif "endpoint" in request.scope:
+        # A mounted app such as /static sets the endpoint and its prefix but no route
+        route = request.scope.get("root_path", "") + "/{path}"
+    else:
+        route = "unmatched"
+    REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    REQUEST_SECONDS.observe(time.perf_counter() - started_at, route=route)
+    return response
+
+
+
 class DataForm:
     def __init__(self, request: Request):
         self.request: Request = request
@@ -73,17 +205,106 @@ class DataForm:
 @app.get("/train")
 async def trainRouteClient():
     try:
-        train_pipeline = TrainPipeline()
+        job, joined = training_job_runner.submit()
 
-        train_pipeline.run_pipeline()
-
-        return Response("Training successful !!")
+        return {"status": True, "joined": joined, "job": job.to_dict()}
 
     except Exception as e:
         return Response(f"Error Occurred! {e}")
 
 
 
+@app.get("/train/{job_id}")
+async def trainStatusRouteClient(job_id: str):
+    job = training_job_runner.get(job_id)
+
+    if job is None:
+        return JSONResponse({"status": False, "error": f"Unknown training job {job_id}"}, status_code=404)
+
+    return {"status": True, "job": job.to_dict()}
+
+
+
+@app.post("/model/reload")
+async def reloadModelRouteClient(force: bool = False):
+    try:
+        # Reloading downloads from S3, which must not block the event loop
+        reloaded = await asyncio.to_thread(inference_pool.reload_model, force)
+
+        return {
+            "status": True,
+            "reloaded": reloaded,
+            "model_version": cost_predictor.model_holder.get_version(),
+        }
+
+    except Exception as e:
+        return {"status": False, "error": f"{e}"}
+
+
+
+@app.get("/model/versions")
+async def modelVersionsRouteClient():
+    return {
+        "status": True,
+        "model_version": cost_predictor.model_holder.version,
+        "pinned_versions": cost_predictor.model_registry.get_resident_versions(),
+    }
+
+
+
+@app.get("/healthz")
+async def healthzRouteClient():
+    return {"status": True}
+
+
+
+@app.get("/readyz")
+async def readyzRouteClient():
+    content = {
+        "status": model_warmup.ready,
+        "model_version": model_warmup.model_version,
+        "error": model_warmup.error,
+    }
+    return JSONResponse(content, status_code=200 if model_warmup.ready else 503)
+
+
+
+@app.get("/metrics")
+async def metricsRouteClient():
+    MODEL_INFO.clear()
+    model_version = cost_predictor.model_holder.get_version()
+    if model_version is not None:
+        MODEL_INFO.set(1, version=model_version)
+
+    return Response(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+
+@app.get("/debug/profile")
+async def profileRouteClient(request: Request, seconds: float = 10, idle: bool = False):
+    # Without a configured token the route does not exist, and a wrong token does not reveal that it does
+    token = request.headers.get(DEBUG_TOKEN_HEADER, "")
+    if not DEBUG_PROFILE_TOKEN or not hmac.compare_digest(token.encode(), DEBUG_PROFILE_TOKEN.encode()):
+        return JSONResponse({"detail": "Not Found"}, status_code=404)
+
+    try:
+        # Sampling from a thread of its own, so this worker keeps serving the traffic being profiled
+        profile = await asyncio.to_thread(stack_profiler.sample, seconds, idle)
+
+    except ProfilerBusyException as e:
+        return JSONResponse({"status": False, "error": f"{e}"}, status_code=409)
+
+    headers = {
+        "X-Profile-Samples": str(profile.samples),
+        "X-Profile-Seconds": f"{profile.seconds:.3f}",
+    }
+    if inference_pool.kind == PROCESS_POOL:
+        # Only this process is sampled, the model runs in the pool's worker processes
+        headers["X-Profile-Warning"] = "inference runs in worker processes that are not sampled"
+    return Response(profile.to_folded(), media_type="text/plain", headers=headers)
+
+
+
 @app.get("/predict")
 async def predictGetRouteClient(request: Request):
     try:
@@ -103,7 +324,8 @@ async def predictRouteClient(request: Request):
     try:
 
         form = DataForm(request)
-        await form.get_shipping_data()
+        with time_stage("form_parse"):
+            await form.get_shipping_data()
 
         shipping_data = shippingData(
             artist=form.artist,
@@ -122,19 +344,283 @@ async def predictRouteClient(request: Request):
             remoteLocation=form.remoteLocation,
         )
 
-        cost_df = shipping_data.get_input_data_frame()
-        cost_predictor = CostPredictor()
-        cost_value = round(cost_predictor.predict(X=cost_df)[0], 2)
+        pinned_version = request.headers.get(MODEL_VERSION_HEADER)
+        # Validated before it is queued, so an invalid form cannot fail the micro-batch it would join
+        validator = await shipment_validators.get(
+            pinned_version or cost_predictor.model_holder.get_version(), pinned_version
+        )
+        with time_stage("request_validation"):
+            record = validator.validate_form(
+                {field: getattr(shipping_data, field) for field in shippingData.FIELD_COLUMNS}
+            )
+        if pinned_version:
+            # Pinned requests skip micro-batching and the cache, which both serve the current model only
+            cost_value = (await inference_pool.run("predict_records", [record], pinned_version))[0]
+        else:
+            model_version = cost_predictor.model_holder.get_version()
+            cost_value = await prediction_cache.get_or_compute(
+                record, model_version, lambda: batch_dispatcher.submit(record)
+            )
+            # A cached or micro-batched prediction has no run time of its own to compare
+            shadow_scorer.submit("predict_records", [record], [cost_value], model_version)
+        cost_value = round(float(cost_value), 2)
 
         return templates.TemplateResponse(
             "index.html",
             {"request": request, "context": cost_value},
         )
 
+    except ShipmentValidationError as e:
+        return JSONResponse({"detail": e.errors}, status_code=422)
+
+    except ModelVersionNotFoundException as e:
+        return JSONResponse({"status": False, "error": f"{e}"}, status_code=404)
+
+    except OVERLOAD_EXCEPTIONS as e:
+        return overloadResponse(e)
 
     except Exception as e:
+        REQUEST_ERRORS.inc(route="/predict")
         return {"status": False, "error": f"{e}"}
 
 
+
+async def predictArrowBatch(request: Request) -> Response:
+    try:
+        import_pyarrow()
+    except ImportError as e:
+        return JSONResponse({"status": False, "error": f"{e}"}, status_code=415)
+
+    try:
+        body = await request.body()
+        if len(body) > ARROW_BATCH_MAX_BYTES:
+            return JSONResponse(
+                {"status": False, "error": f"Arrow stream of {len(body)} bytes exceeds the limit of {ARROW_BATCH_MAX_BYTES}"},
+                status_code=413,
+            )
+
+        # The stream goes to the worker as bytes, so a process pool receives it without pickling a table
+        predictions = await inference_pool.run(
+            "predict_arrow", body, request.headers.get(MODEL_VERSION_HEADER) or None
+        )
+        return Response(content=predictions, media_type=ARROW_STREAM_CONTENT_TYPE)
+
+    except ExplanationNotSupportedException as e:
+        return JSONResponse({"status": False, "error": f"{e}"}, status_code=400)
+
+    except ModelVersionNotFoundException as e:
+        return JSONResponse({"status": False, "error": f"{e}"}, status_code=404)
+
+    except OVERLOAD_EXCEPTIONS as e:
+        return overloadResponse(e)
+
+    except Exception as e:
+        REQUEST_ERRORS.inc(route="/predict/batch")
+        return JSONResponse({"status": False, "error": f"{e}"}, status_code=400)
+
+
+
+# Explanations are keyed by the request field names, like the shipments
+EXPLANATION_NAMES = {column: field for field, column in shippingData.FIELD_COLUMNS.items()}
+
+
+
+@app.post("/predict/batch")
+async def predictBatchRouteClient(request: Request, explain: bool = False):
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type == ARROW_STREAM_CONTENT_TYPE:
+        return await predictArrowBatch(request)
+
+    try:
+        shipments = await request.json()
+
+        if not isinstance(shipments, list):
+            return JSONResponse(
+                {"status": False, "error": "Request body must be a JSON array of shipments"},
+                status_code=400,
+            )
+
+        if len(shipments) > PREDICT_BATCH_MAX_SIZE:
+            return JSONResponse(
+                {"status": False, "error": f"Batch size {len(shipments)} exceeds the limit of {PREDICT_BATCH_MAX_SIZE}"},
+                status_code=413,
+            )
+
+        pinned_version = request.headers.get(MODEL_VERSION_HEADER)
+        if explain:
+            cost_values, explanation = await inference_pool.run(
+                "explain_shipments", shipments, pinned_version or None
+            )
+            return {
+                "status": True,
+                "predictions": [round(float(v), 2) for v in cost_values],
+                "explanations": explanation.to_records(EXPLANATION_NAMES),
+            }
+
+        if pinned_version:
+            cost_values = await inference_pool.run("predict_shipments", shipments, pinned_version)
+        else:
+            model_version = cost_predictor.model_holder.get_version()
+            cost_values, champion_seconds = await inference_pool.run_timed("predict_shipments", shipments)
+            shadow_scorer.submit("predict_shipments", shipments, cost_values, model_version, champion_seconds)
+
+        return {"status": True, "predictions": [round(float(v), 2) for v in cost_values]}
+
+    except ExplanationNotSupportedException as e:
+        return JSONResponse({"status": False, "error": f"{e}"}, status_code=400)
+
+    except ModelVersionNotFoundException as e:
+        return JSONResponse({"status": False, "error": f"{e}"}, status_code=404)
+
+    except OVERLOAD_EXCEPTIONS as e:
+        return overloadResponse(e)
+
+    except Exception as e:
+        REQUEST_ERRORS.inc(route="/predict/batch")
+        return {"status": False, "error": f"{e}"}
+
+
+def fastJsonResponse(content, status_code: int = 200) -> Response:
+    return Response(content=dumps_json(content), status_code=status_code, media_type="application/json")
+
+
+
+@app.get("/v1/schema")
+async def schemaV1RouteClient(request: Request):
+    try:
+        pinned_version = request.headers.get(MODEL_VERSION_HEADER) or None
+        model_version = pinned_version or cost_predictor.model_holder.get_version()
+        validator = await shipment_validators.get(model_version, pinned_version)
+
+        return fastJsonResponse(validator.json_schema)
+
+    except ModelVersionNotFoundException as e:
+        return fastJsonResponse({"status": False, "error": f"{e}"}, status_code=404)
+
+    except OVERLOAD_EXCEPTIONS as e:
+        return overloadResponse(e)
+
+    except Exception as e:
+        REQUEST_ERRORS.inc(route="/v1/schema")
+        return fastJsonResponse({"status": False, "error": f"{e}"}, status_code=500)
+
+
+
+@app.post("/v1/predict")
+async def predictV1RouteClient(request: Request, explain: bool = False):
+    try:
+        try:
+            with time_stage("json_parse"):
+                payload = loads_json(await request.body())
+        except ValueError as e:
+            return fastJsonResponse(
+                {"detail": [{"loc": ["body"], "msg": f"Invalid JSON: {e}", "type": "json_invalid"}]},
+                status_code=422,
+            )
+
+        is_batch = isinstance(payload, list)
+        if is_batch and len(payload) > PREDICT_BATCH_MAX_SIZE:
+            return fastJsonResponse(
+                {"status": False, "error": f"Batch size {len(payload)} exceeds the limit of {PREDICT_BATCH_MAX_SIZE}"},
+                status_code=413,
+            )
+
+        pinned_version = request.headers.get(MODEL_VERSION_HEADER) or None
+        model_version = pinned_version or cost_predictor.model_holder.get_version()
+        if is_batch and not payload:
+            return fastJsonResponse({"status": True, "model_version": model_version, "predictions": []})
+
+        validator = await shipment_validators.get(model_version, pinned_version)
+        with time_stage("request_validation"):
+            records = validator.validate_many(payload) if is_batch else [validator.validate(payload)]
+
+        explanation = None
+        champion_seconds = None
+        if explain:
+            cost_values, explanation = await inference_pool.run("explain_records", records, pinned_version)
+        elif is_batch or pinned_version:
+            cost_values, champion_seconds = await inference_pool.run_timed(
+                "predict_records", records, pinned_version
+            )
+        else:
+            record = records[0]
+            cost_values = [
+                await prediction_cache.get_or_compute(
+                    record, model_version, lambda: batch_dispatcher.submit(record)
+                )
+            ]
+        if pinned_version is None:
+            shadow_scorer.submit("predict_records", records, cost_values, model_version, champion_seconds)
+
+        predictions = [round(float(v), 2) for v in cost_values]
+        # The version is not known before the first model load
+        content = {"status": True, "model_version": model_version or cost_predictor.model_holder.get_version()}
+        explanations = explanation.to_records(EXPLANATION_NAMES) if explanation is not None else None
+        if is_batch:
+            content["predictions"] = predictions
+            if explanations is not None:
+                content["explanations"] = explanations
+        else:
+            content["prediction"] = predictions[0]
+            if explanations is not None:
+                content["explanation"] = explanations[0]
+        return fastJsonResponse(content)
+
+    except ShipmentValidationError as e:
+        return fastJsonResponse({"detail": e.errors}, status_code=422)
+
+    except ExplanationNotSupportedException as e:
+        return fastJsonResponse({"status": False, "error": f"{e}"}, status_code=400)
+
+    except ModelVersionNotFoundException as e:
+        return fastJsonResponse({"status": False, "error": f"{e}"}, status_code=404)
+
+    except OVERLOAD_EXCEPTIONS as e:
+        return overloadResponse(e)
+
+    except Exception as e:
+        REQUEST_ERRORS.inc(route="/v1/predict")
+        return fastJsonResponse({"status": False, "error": f"{e}"}, status_code=500)
+
+
+
+@app.post("/predict/bulk")
+async def predictBulkRouteClient(request: Request):
+    try:
+        form = await request.form()
+        upload = form.get("file")
+
+        if upload is None or isinstance(upload, str):
+            return JSONResponse(
+                {"status": False, "error": "Expected a multipart upload in the 'file' field"},
+                status_code=400,
+            )
+
+        input_format = bulk_predictor.get_input_format(upload.filename, upload.content_type)
+        chunks = bulk_predictor.read_chunks(upload.file, input_format)
+
+        # Reading the first chunk up front so a malformed file is rejected before streaming starts
+        first_chunk = await asyncio.to_thread(next, chunks, None)
+        if first_chunk is None:
+            return JSONResponse({"status": False, "error": "Uploaded file is empty"}, status_code=400)
+
+        missing_columns = bulk_predictor.get_missing_columns(first_chunk)
+        if missing_columns:
+            return JSONResponse(
+                {"status": False, "error": f"Missing columns: {missing_columns}"},
+                status_code=400,
+            )
+
+        # An error after this point ends the 200 response with an error line, see BulkPredictor.predict_chunks
+        return StreamingResponse(
+            bulk_predictor.predict_chunks(itertools.chain([first_chunk], chunks), input_format),
+            media_type="text/csv" if input_format == CSV_FORMAT else "application/x-ndjson",
+        )
+
+    except Exception as e:
+        REQUEST_ERRORS.inc(route="/predict/bulk")
+        return JSONResponse({"status": False, "error": f"{e}"}, status_code=400)
+
+
 if __name__ == "__main__":
     app_run(app, host=APP_HOST, port=APP_PORT)
\ No newline at end of file
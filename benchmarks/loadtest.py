@@ -0,0 +1,373 @@
+"""HTTP load generator for the prediction service.
+
+Samples shipments from data/train.csv and drives /predict and /predict/batch, either closed-loop with a fixed
+number of concurrent clients or open-loop with Poisson arrivals at a fixed rate. Latency percentiles and
+throughput are written to a json result file.
+
+    python benchmarks/loadtest.py --start-server --concurrency 32 --duration 60 --output loadtest.json
+    python benchmarks/loadtest.py --start-server --model artifacts/.../shipping_price_model.pkl
+    python benchmarks/loadtest.py --url http://127.0.0.1:8080 --rate 500 --mix predict=0.9,batch=0.1
+
+Without --model, --start-server serves a stand-in model fitted on the data file at the start of the run, the
+production preprocessor and the --stand-in model family of config/model.yaml, so no S3 bucket is needed.
+Only the standard library is needed to drive the load. Starting the server needs the app's dependencies.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from shipment.components.model_predictor import shippingData  # noqa: E402
+
+PERCENTILES = (50, 95, 99, 99.9)
+
+
+def load_shipments(data_path: str, limit: int) -> List[Dict[str, str]]:
+    """Reads shipments keyed by request field name, skipping rows with an empty input field."""
+    shipments = []
+    with open(data_path, newline="") as file_obj:
+        for row in csv.DictReader(file_obj):
+            shipment = {field: row[column] for field, column in shippingData.FIELD_COLUMNS.items()}
+            if all(value != "" for value in shipment.values()):
+                shipments.append(shipment)
+            if len(shipments) >= limit:
+                break
+    return shipments
+
+
+def parse_mix(mix: str) -> List[Tuple[str, float]]:
+    weights = []
+    for item in mix.split(","):
+        route, weight = item.split("=")
+        if route not in ("predict", "batch"):
+            raise ValueError(f"Unknown route {route!r} in mix, expected predict or batch")
+        weights.append((route, float(weight)))
+    return weights
+
+
+def build_request(route: str, shipments: List[Dict[str, str]], batch_size: int) -> Tuple[str, str, bytes]:
+    if route == "predict":
+        body = urllib.parse.urlencode(random.choice(shipments)).encode()
+        return "/predict", "application/x-www-form-urlencoded", body
+    body = json.dumps(random.choices(shipments, k=batch_size)).encode()
+    return "/predict/batch", "application/json", body
+
+
+class Connection:
+    """Minimal HTTP/1.1 keep-alive client, enough for the service's small fixed-length responses."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, path: str, content_type: str, body: bytes) -> int:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        head = (
+            f"POST {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+            f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n"
+        )
+        try:
+            self.writer.write(head.encode() + body)
+            await self.writer.drain()
+
+            status_line = await self.reader.readline()
+            if not status_line:
+                raise ConnectionError("Connection closed by the server")
+            status = int(status_line.split()[1])
+
+            headers = {}
+            while True:
+                line = await self.reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            if headers.get("transfer-encoding") == "chunked":
+                while True:
+                    size = int((await self.reader.readline()).strip(), 16)
+                    await self.reader.readexactly(size + 2)
+                    if size == 0:
+                        break
+            else:
+                await self.reader.readexactly(int(headers.get("content-length", 0)))
+
+            if headers.get("connection") == "close":
+                self.close()
+            return status
+
+        except Exception:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+class Recorder:
+    def __init__(self, measure_from: float):
+        self.measure_from = measure_from
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        # Open-loop arrivals not sent because max_in_flight requests were pending
+        self.dropped = 0
+
+    def record(self, route: str, scheduled_at: float, status: str) -> None:
+        if scheduled_at < self.measure_from:
+            return
+        self.latencies[route].append(time.perf_counter() - scheduled_at)
+        self.statuses[route][status] += 1
+
+
+async def send(connection: Connection, recorder: Recorder, route: str, request, scheduled_at: float) -> None:
+    try:
+        status = str(await connection.request(*request))
+    except Exception as e:
+        status = type(e).__name__
+    recorder.record(route, scheduled_at, status)
+
+
+async def run_closed_loop(args, url, shipments, mix, recorder: Recorder, deadline: float) -> None:
+    routes, weights = zip(*mix)
+
+    async def client():
+        connection = Connection(url.hostname, url.port)
+        while time.perf_counter() < deadline:
+            route = random.choices(routes, weights)[0]
+            request = build_request(route, shipments, args.batch_size)
+            await send(connection, recorder, route, request, time.perf_counter())
+        connection.close()
+
+    await asyncio.gather(*(client() for _ in range(args.concurrency)))
+
+
+async def run_open_loop(args, url, shipments, mix, recorder: Recorder, deadline: float) -> None:
+    routes, weights = zip(*mix)
+    idle: List[Connection] = []
+    in_flight = set()
+
+    async def fire(route, request, scheduled_at):
+        connection = idle.pop() if idle else Connection(url.hostname, url.port)
+        try:
+            await send(connection, recorder, route, request, scheduled_at)
+        finally:
+            idle.append(connection)
+
+    # Latency is measured from the scheduled arrival, so a slow server cannot hide queueing delay
+    next_arrival = time.perf_counter()
+    while next_arrival < deadline:
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if len(in_flight) < args.max_in_flight:
+            route = random.choices(routes, weights)[0]
+            request = build_request(route, shipments, args.batch_size)
+            task = asyncio.create_task(fire(route, request, next_arrival))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        else:
+            if next_arrival >= recorder.measure_from:
+                recorder.dropped += 1
+
+        next_arrival += random.expovariate(args.rate)
+
+    if in_flight:
+        await asyncio.wait(in_flight)
+    for connection in idle:
+        connection.close()
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    # Nearest-rank percentile
+    index = max(0, math.ceil(q / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(recorder: Recorder, elapsed: float) -> Dict:
+    routes = {}
+    all_latencies = []
+    for route, latencies in recorder.latencies.items():
+        latencies = sorted(latencies)
+        all_latencies.extend(latencies)
+        routes[route] = {
+            "requests": len(latencies),
+            "throughput_rps": len(latencies) / elapsed,
+            "statuses": dict(recorder.statuses[route]),
+            "latency_ms": {
+                **{f"p{q:g}": percentile(latencies, q) * 1000 for q in PERCENTILES},
+                "mean": sum(latencies) / len(latencies) * 1000,
+                "max": latencies[-1] * 1000,
+            },
+        }
+
+    all_latencies.sort()
+    errors = sum(
+        count
+        for statuses in recorder.statuses.values()
+        for status, count in statuses.items()
+        if status != "200"
+    )
+    overall = {
+        "requests": len(all_latencies),
+        "errors": errors,
+        "dropped": recorder.dropped,
+        "throughput_rps": len(all_latencies) / elapsed,
+    }
+    if all_latencies:
+        overall["latency_ms"] = {f"p{q:g}": percentile(all_latencies, q) * 1000 for q in PERCENTILES}
+    return {"overall": overall, "routes": routes}
+
+
+def wait_until_ready(base_url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(base_url + "/readyz", timeout=2) as response:
+                if response.status == 200:
+                    return
+        except Exception:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"Service at {base_url} did not become ready within {timeout} seconds")
+
+
+def fit_stand_in_model(args, model_dir: str) -> str:
+    """Fits the stand-in model on the data file and saves it in model_dir, in the --model-format format."""
+    # Imported here, driving the load against a running service needs only the standard library
+    from benchmarks.microbench import fit_models, load_training_frame
+    from shipment.components.mapped_model import MappedCostModel
+    from shipment.utils.main_utils import MainUtils
+
+    data = load_training_frame(args.data)
+    cost_model = fit_models(data.drop(columns=["Cost"]), data["Cost"], args.seed, [args.stand_in])[args.stand_in]
+    if args.model_format == "mapped":
+        model_path = os.path.join(model_dir, "mapped_model")
+        MappedCostModel.from_cost_model(cost_model).save(model_path)
+    else:
+        model_path = os.path.join(model_dir, "shipping_price_model.pkl")
+        MainUtils.save_object(model_path, cost_model)
+    print(f"Serving a stand-in {args.stand_in} model fitted on {args.data}", flush=True)
+    return model_path
+
+
+def start_server(args, url, model_path: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env["SHIPMENT_LOCAL_MODEL_PATH"] = os.path.abspath(model_path)
+    if args.model_format:
+        env["MODEL_ARTIFACT_FORMAT"] = args.model_format
+    command = [
+        sys.executable, "-m", "uvicorn", "app:app",
+        "--host", url.hostname, "--port", str(url.port),
+        "--workers", str(args.server_workers), "--log-level", "warning",
+    ]
+    return subprocess.Popen(command, cwd=ROOT_DIR, env=env)
+
+
+def get_arguments(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--mix", default="predict=1", help="route weights, e.g. predict=0.9,batch=0.1")
+    parser.add_argument("--batch-size", type=int, default=32, help="shipments per /predict/batch request")
+    parser.add_argument("--concurrency", type=int, default=16, help="clients of the closed-loop mode")
+    parser.add_argument("--rate", type=float, default=0.0, help="requests per second, switches to open-loop mode")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="open-loop limit of pending requests")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds of load before measuring")
+    parser.add_argument("--data", default=os.path.join(ROOT_DIR, "data", "train.csv"))
+    parser.add_argument("--sample-size", type=int, default=5000, help="shipments sampled from the data file")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="loadtest_result.json")
+    parser.add_argument("--start-server", action="store_true", help="start app.py with uvicorn for the run")
+    parser.add_argument("--model", help="local model file or mapped model directory served by --start-server")
+    parser.add_argument(
+        "--stand-in", default="XGBRegressor", help="model family of the stand-in model served without --model"
+    )
+    parser.add_argument("--model-format", choices=("pickle", "mapped"))
+    parser.add_argument("--server-workers", type=int, default=1)
+    parser.add_argument("--ready-timeout", type=float, default=120.0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> Dict:
+    args = get_arguments(argv)
+    random.seed(args.seed)
+    url = urllib.parse.urlsplit(args.url)
+    mix = parse_mix(args.mix)
+    shipments = load_shipments(args.data, args.sample_size)
+
+    server = stand_in_dir = None
+    try:
+        if args.start_server:
+            model_path = args.model
+            if not model_path:
+                stand_in_dir = tempfile.mkdtemp(prefix="loadtest-model-")
+                model_path = fit_stand_in_model(args, stand_in_dir)
+            server = start_server(args, url, model_path)
+        wait_until_ready(args.url, args.ready_timeout)
+
+        started_at = time.perf_counter()
+        recorder = Recorder(measure_from=started_at + args.warmup)
+        deadline = started_at + args.warmup + args.duration
+        runner = run_open_loop if args.rate > 0 else run_closed_loop
+        asyncio.run(runner(args, url, shipments, mix, recorder, deadline))
+        elapsed = time.perf_counter() - recorder.measure_from
+
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if stand_in_dir is not None:
+            shutil.rmtree(stand_in_dir, ignore_errors=True)
+
+    result = {
+        "config": {
+            "url": args.url,
+            "mode": "open" if args.rate > 0 else "closed",
+            "rate": args.rate or None,
+            "concurrency": None if args.rate > 0 else args.concurrency,
+            "mix": dict(mix),
+            "batch_size": args.batch_size,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "model": args.model or (f"stand-in {args.stand_in}" if args.start_server else None),
+        },
+        "host": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        **summarize(recorder, elapsed),
+    }
+    with open(args.output, "w") as file_obj:
+        json.dump(result, file_obj, indent=2)
+
+    overall = result["overall"]
+    print(
+        f"{overall['requests']} requests, {overall['errors']} errors, {overall['throughput_rps']:.1f} req/s, "
+        + ", ".join(f"{name} {value:.2f}ms" for name, value in overall.get("latency_ms", {}).items())
+    )
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Tuple
+from shipment.constant import *
+from shipment.exception import AdmissionRejectedException
+from shipment.logger import get_logger
+from shipment.utils.metrics import REGISTRY
+
+logger = get_logger(__name__)
+
+
+ADMISSION_IN_FLIGHT = REGISTRY.gauge(
+    "shipment_admission_in_flight", "Admitted requests that have not finished yet, by route", ["route"]
+)
+ADMISSION_QUEUE_DEPTH = REGISTRY.gauge(
+    "shipment_admission_queue_depth", "Requests waiting for admission, by route", ["route"]
+)
+ADMISSION_SHED = REGISTRY.counter(
+    "shipment_admission_shed_total",
+    "Requests rejected by admission control, by route and reason: queue_full or deadline",
+    ["route", "reason"],
+)
+ADMISSION_WAIT_SECONDS = REGISTRY.histogram(
+    "shipment_admission_wait_seconds", "Time admitted requests waited in the admission queue", ["route"]
+)
+
+QUEUE_FULL = "queue_full"
+DEADLINE = "deadline"
+
+
+class AdmissionLimiter:
+    def __init__(self, route: str, max_concurrency: int, max_queue: int, deadline: float):
+        if max_concurrency < 1 or max_queue < 0 or deadline <= 0:
+            raise ValueError(f"Invalid admission limits {max_concurrency}:{max_queue}:{deadline} for {route}")
+
+        self.route = route
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.deadline = deadline
+        # Only touched from the event loop, so no lock is needed
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Moving average of the time a request holds its slot, used to predict queueing delay
+        self._service_seconds: Optional[float] = None
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def _estimate_wait(self, position: int) -> float:
+        return position * (self._service_seconds or 0.0) / self.max_concurrency
+
+    def _shed(self, reason: str) -> AdmissionRejectedException:
+        ADMISSION_SHED.inc(route=self.route, reason=reason)
+        retry_after = max(1, math.ceil(self._estimate_wait(len(self._waiters) + 1)))
+        if reason == QUEUE_FULL:
+            return AdmissionRejectedException(
+                f"Too many requests to {self.route}, {len(self._waiters)} are already waiting", 429, retry_after
+            )
+        return AdmissionRejectedException(
+            f"Request to {self.route} could not be admitted within {self.deadline} seconds", 503, retry_after
+        )
+
+    def _update_gauges(self) -> None:
+        ADMISSION_IN_FLIGHT.set(self._in_flight, route=self.route)
+        ADMISSION_QUEUE_DEPTH.set(len(self._waiters), route=self.route)
+
+    async def acquire(self) -> float:
+
+        """
+        Method Name :   acquire
+
+        Description :   This method takes a concurrency slot, waiting in a bounded FIFO queue when all slots are
+                        busy. A request is rejected at once when the queue is full or when the predicted
+                        wait already exceeds the deadline, and rejected when the deadline passes in the queue.
+
+        Output      :   Time the slot was taken, to pass to release
+        """
+        arrived_at = time.perf_counter()
+        if self._in_flight < self.max_concurrency and not self._waiters:
+            self._in_flight += 1
+            self._update_gauges()
+            ADMISSION_WAIT_SECONDS.observe(0.0, route=self.route)
+            return arrived_at
+
+        if len(self._waiters) >= self.max_queue:
+            raise self._shed(QUEUE_FULL)
+        if self._estimate_wait(len(self._waiters) + 1) > self.deadline:
+            # Failing fast instead of queueing a request that would time out anyway
+            raise self._shed(DEADLINE)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._update_gauges()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.deadline)
+
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait ended
+                if isinstance(e, asyncio.CancelledError):
+                    self.release(time.perf_counter())
+                    raise
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+                self._update_gauges()
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                raise self._shed(DEADLINE)
+
+        admitted_at = time.perf_counter()
+        ADMISSION_WAIT_SECONDS.observe(admitted_at - arrived_at, route=self.route)
+        return admitted_at
+
+    def release(self, admitted_at: float) -> None:
+        service_seconds = time.perf_counter() - admitted_at
+        self._service_seconds = (
+            service_seconds
+            if self._service_seconds is None
+            else 0.8 * self._service_seconds + 0.2 * service_seconds
+        )
+
+        # Handing the slot straight to the oldest waiter keeps the queue FIFO
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._update_gauges()
+                return
+
+        self._in_flight -= 1
+        self._update_gauges()
+
+
+class AdmissionController:
+    def __init__(self, limits: str = ADMISSION_LIMITS):
+        self.limiters: Dict[str, AdmissionLimiter] = {
+            route: AdmissionLimiter(route, *route_limits)
+            for route, route_limits in self.parse_limits(limits).items()
+        }
+        for limiter in self.limiters.values():
+            logger.info(
+                f"Admission control for {limiter.route}: {limiter.max_concurrency} concurrent, "
+                f"{limiter.max_queue} queued, {limiter.deadline} seconds deadline"
+            )
+
+    @staticmethod
+    def parse_limits(limits: str) -> Dict[str, Tuple[int, int, float]]:
+        """Parses comma separated [METHOD ]route=max_concurrency:max_queue:deadline_seconds settings, a route
+        without a method is limited for every method."""
+        parsed = {}
+        for item in limits.split(","):
+            if "=" not in item:
+                continue
+            route, values = item.split("=", 1)
+            max_concurrency, max_queue, deadline = values.strip().split(":")
+            method, _, path = route.strip().rpartition(" ")
+            route = f"{method.strip().upper()} {path}" if method.strip() else path
+            parsed[route] = (int(max_concurrency), int(max_queue), float(deadline))
+        return parsed
+
+    def get_limiter(self, method: str, path: str) -> Optional[AdmissionLimiter]:
+        # GET /predict serves the form page, it must not take the slots of the POST /predict quotes
+        path = path.rstrip("/") or "/"
+        return self.limiters.get(f"{method.upper()} {path}") or self.limiters.get(path)
+
+
+class AdmissionMiddleware:
+    def __init__(
+        self,
+        app,
+        admission_controller: AdmissionController,
+        reject: Callable[[AdmissionRejectedException], object],
+    ):
+        self.app = app
+        self.admission_controller = admission_controller
+        # Builds the response sent for a shed request
+        self.reject = reject
+
+    async def __call__(self, scope, receive, send) -> None:
+
+        """
+        Method Name :   __call__
+
+        Description :   This method admits HTTP requests to a limited route before they reach the app. The slot
+                        is released once the last body message of the response is sent, so a streamed bulk
+                        prediction holds it for as long as it runs, and at the latest when the app returns or
+                        fails, even if the response never started.
+
+        Output      :   None
+        """
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.admission_controller.get_limiter(scope["method"], scope["path"])
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            admitted_at = await limiter.acquire()
+        except AdmissionRejectedException as e:
+            await self.reject(e)(scope, receive, send)
+            return
+
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                limiter.release(admitted_at)
+
+        async def send_and_release(message) -> None:
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                release()
+
+        try:
+            await self.app(scope, receive, send_and_release)
+        finally:
+            release()
@@ -0,0 +1,128 @@
+import sys
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from shipment.constant import *
+from shipment.exception import ShippingException
+from shipment.logger import get_logger
+from shipment.utils.main_utils import MainUtils
+
+logger = get_logger(__name__)
+
+
+ARROW_STREAM_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def import_pyarrow():
+    """Imports pyarrow on first use, it is an optional dependency of the serving app."""
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.ipc
+    except ImportError as e:
+        raise ImportError(
+            f"pyarrow is required for {ARROW_STREAM_CONTENT_TYPE} requests, install it with pip install pyarrow"
+        ) from e
+    return pyarrow
+
+
+class ArrowColumns:
+    def __init__(
+        self,
+        categorical: Dict[str, Tuple[np.ndarray, np.ndarray]],
+        numeric: Dict[str, np.ndarray],
+        n_rows: int,
+        ids: Optional[object] = None,
+    ):
+        # Categorical columns as (codes, categories) with code -1 for a missing value
+        self.categorical = categorical
+        self.numeric = numeric
+        self.n_rows = n_rows
+        # Id column of the request, passed through to the response as an Arrow array
+        self.ids = ids
+
+
+class ArrowBatchCodec:
+    def __init__(self, input_columns: List[str]):
+        self.input_columns = list(input_columns)
+        schema_config = MainUtils().read_yaml_file(filename=SCHEMA_FILE_PATH)
+        self.column_types = {
+            column: dtype
+            for column_type in schema_config["columns"]
+            for column, dtype in column_type.items()
+        }
+
+    def read_columns(self, body: bytes) -> ArrowColumns:
+
+        """
+        Method Name :   read_columns
+
+        Description :   This method reads an Arrow IPC stream and types each input column as the schema file
+                        says. Float columns become float64 arrays with NaN for nulls, other columns are
+                        dictionary-encoded into integer codes and their distinct values.
+
+        Output      :   ArrowColumns
+        """
+        logger.info("Entered read_columns method of ArrowBatchCodec class")
+        try:
+            pa = import_pyarrow()
+            table = pa.ipc.open_stream(body).read_all()
+
+            missing_columns = [c for c in self.input_columns if c not in table.column_names]
+            if missing_columns:
+                raise ValueError(f"Arrow stream is missing columns {missing_columns}")
+
+            categorical, numeric = {}, {}
+            for column in self.input_columns:
+                values = table.column(column)
+                if self.column_types[column].startswith("float"):
+                    numeric[column] = (
+                        values.cast(pa.float64()).to_numpy(zero_copy_only=False)
+                        if values.null_count == 0
+                        else pa.compute.fill_null(values.cast(pa.float64()), np.nan).to_numpy()
+                    )
+                else:
+                    categorical[column] = self._dictionary_encode(pa, values)
+
+            ids = None
+            if BULK_PREDICT_ID_COLUMN in table.column_names:
+                ids = table.column(BULK_PREDICT_ID_COLUMN).combine_chunks()
+
+            logger.info("Exited read_columns method of ArrowBatchCodec class")
+            return ArrowColumns(categorical, numeric, table.num_rows, ids)
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+    @staticmethod
+    def _dictionary_encode(pa, values) -> Tuple[np.ndarray, np.ndarray]:
+        if not pa.types.is_dictionary(values.type):
+            values = pa.compute.dictionary_encode(values.cast(pa.string()))
+        values = values.unify_dictionaries().combine_chunks()
+
+        categories = values.dictionary.cast(pa.string()).to_numpy(zero_copy_only=False)
+        codes = values.indices.fill_null(-1).to_numpy(zero_copy_only=False).astype(np.intp)
+        return codes, categories
+
+    @staticmethod
+    def write_predictions(predictions: np.ndarray, ids: Optional[object] = None) -> bytes:
+
+        """
+        Method Name :   write_predictions
+
+        Description :   This method writes the predictions, and the id column of the request if it had one, as a
+                        single record batch in an Arrow IPC stream.
+
+        Output      :   Arrow IPC stream bytes
+        """
+        pa = import_pyarrow()
+        arrays = [pa.array(np.asarray(predictions, dtype=np.float64))]
+        names = [TARGET_COLUMN]
+        if ids is not None:
+            arrays.insert(0, ids)
+            names.insert(0, BULK_PREDICT_ID_COLUMN)
+
+        batch = pa.RecordBatch.from_arrays(arrays, names=names)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, batch.schema) as writer:
+            writer.write_batch(batch)
+        return sink.getvalue().to_pybytes()
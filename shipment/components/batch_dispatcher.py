@@ -0,0 +1,158 @@
+import asyncio
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from shipment.constant import *
+from shipment.components.inference_pool import InferencePool
+from shipment.exception import InferenceQueueFullException, InferenceTimeoutException
+from shipment.logger import get_logger
+from shipment.utils.metrics import REGISTRY
+
+logger = get_logger(__name__)
+
+
+# Failures of a saturated pool, scoring the rows one by one would only add to its load
+OVERLOAD_EXCEPTIONS = (InferenceQueueFullException, InferenceTimeoutException)
+
+BATCH_SIZE = REGISTRY.histogram(
+    "shipment_micro_batch_size",
+    "Number of single-shipment requests scored together in one micro-batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+BATCH_WAIT_SECONDS = REGISTRY.histogram(
+    "shipment_micro_batch_wait_seconds",
+    "Time a single-shipment request waited in the queue before its micro-batch was flushed",
+)
+
+
+class MicroBatchDispatcher:
+    def __init__(
+        self,
+        inference_pool: InferencePool,
+        max_batch_size: int = MICRO_BATCH_MAX_SIZE,
+        max_wait_ms: float = MICRO_BATCH_MAX_WAIT_MS,
+    ):
+        self.inference_pool = inference_pool
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flushes: Set[asyncio.Task] = set()
+        # Requests taken off the queue for the batch that is still forming
+        self._forming: List[Tuple[Dict, asyncio.Future, float]] = []
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+            logger.info(
+                f"Started micro-batch dispatcher with max batch size {self.max_batch_size} "
+                f"and max wait {self.max_wait * 1000} ms"
+            )
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+            # Requests that were never flushed would otherwise wait forever
+            error = RuntimeError("Micro-batch dispatcher was stopped before the request was scored")
+            pending, self._forming = self._forming, []
+            while not self._queue.empty():
+                pending.append(self._queue.get_nowait())
+            for _, future, _ in pending:
+                self._set_exception(future, error)
+
+    async def submit(self, record: Dict) -> float:
+
+        """
+        Method Name :   submit
+
+        Description :   This method queues one shipment record and waits for the prediction of the
+                        micro-batch it was grouped into. The record should already be validated, an invalid
+                        one fails its whole micro-batch before the rows are scored again one by one.
+
+        Output      :   Predicted cost of the shipment
+        """
+        if self._task is None:
+            await self.start()
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((record, future, time.perf_counter()))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = self._forming = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Flushing in its own task so the next batch can form while this one is being scored
+            self._forming = []
+            flush = asyncio.create_task(self._flush(batch))
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: List[Tuple[Dict, asyncio.Future, float]]) -> None:
+        flushed_at = time.perf_counter()
+        BATCH_SIZE.observe(len(batch))
+        for _, _, enqueued_at in batch:
+            BATCH_WAIT_SECONDS.observe(flushed_at - enqueued_at)
+
+        try:
+            cost_values = await self._predict([record for record, _, _ in batch])
+
+        except OVERLOAD_EXCEPTIONS as e:
+            for _, future, _ in batch:
+                self._set_exception(future, e)
+            return
+
+        except Exception as e:
+            if len(batch) > 1:
+                # Requests are validated before they are queued, so this is rare. One shipment that still
+                # fails must not fail the requests it was grouped with, they are scored alone, concurrently.
+                logger.error(f"Micro-batch of {len(batch)} requests failed, scoring them one by one: {e}")
+                await asyncio.gather(*[self._flush_one(item) for item in batch])
+                return
+
+            self._set_exception(batch[0][1], e)
+            return
+
+        for (_, future, _), cost_value in zip(batch, cost_values):
+            if not future.done():
+                future.set_result(float(cost_value))
+
+    async def _flush_one(self, item: Tuple[Dict, asyncio.Future, float]) -> None:
+        record, future, _ = item
+        try:
+            cost_value = (await self._predict([record]))[0]
+        except Exception as e:
+            self._set_exception(future, e)
+            return
+
+        if not future.done():
+            future.set_result(float(cost_value))
+
+    async def _predict(self, records: List[Dict]):
+        return await self.inference_pool.run("predict_records", records)
+
+    @staticmethod
+    def _set_exception(future: asyncio.Future, error: Exception) -> None:
+        if not future.done():
+            future.set_exception(error)
@@ -0,0 +1,143 @@
+import asyncio
+import itertools
+import json
+import os
+from typing import IO, AsyncIterator, Iterator, List
+import pandas as pd
+from pandas import DataFrame
+from shipment.constant import *
+from shipment.components.inference_pool import InferencePool
+from shipment.components.model_predictor import shippingData
+from shipment.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+CSV_FORMAT = "csv"
+NDJSON_FORMAT = "ndjson"
+# First field of the line that ends a stream cut short by an error, a complete stream never contains it
+BULK_ERROR_MARKER = "#error"
+
+
+class BulkPredictor:
+    def __init__(
+        self, inference_pool: InferencePool, chunk_size: int = BULK_PREDICT_CHUNK_SIZE
+    ):
+        self.inference_pool = inference_pool
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def get_input_format(filename: str, content_type: str) -> str:
+
+        """
+        Method Name :   get_input_format
+
+        Description :   This method detects whether an uploaded file is CSV or NDJSON from its content type
+                        or file extension.
+
+        Output      :   "csv" or "ndjson"
+        """
+        extension = os.path.splitext(filename or "")[1].lower()
+        content_type = (content_type or "").split(";")[0].strip().lower()
+
+        if extension in (".ndjson", ".jsonl") or content_type in (
+            "application/x-ndjson",
+            "application/jsonl",
+        ):
+            return NDJSON_FORMAT
+
+        if extension == ".csv" or content_type in ("text/csv", "application/csv"):
+            return CSV_FORMAT
+
+        raise ValueError(
+            f"Unsupported upload {filename!r} ({content_type}), expected a .csv or .ndjson file"
+        )
+
+    def read_chunks(self, file_obj: IO[bytes], input_format: str) -> Iterator[DataFrame]:
+
+        """
+        Method Name :   read_chunks
+
+        Description :   This method reads the uploaded file lazily, chunk_size rows at a time, so memory stays
+                        bounded by the chunk size and not by the file size.
+
+        Output      :   Iterator of DataFrames
+        """
+        if input_format == CSV_FORMAT:
+            yield from pd.read_csv(file_obj, chunksize=self.chunk_size)
+            return
+
+        records: List[dict] = []
+        for line in file_obj:
+            if not line.strip():
+                continue
+            records.append(json.loads(line))
+            if len(records) == self.chunk_size:
+                yield pd.DataFrame.from_records(records)
+                records = []
+
+        if records:
+            yield pd.DataFrame.from_records(records)
+
+    @staticmethod
+    def get_missing_columns(chunk: DataFrame) -> List[str]:
+        return [
+            column
+            for column in shippingData.FIELD_COLUMNS.values()
+            if column not in chunk.columns
+        ]
+
+    @staticmethod
+    def get_error_line(error: Exception, output_format: str) -> bytes:
+        """Returns the line that ends a stream cut short by error, in the output format."""
+        message = " ".join(str(error).split())
+        if output_format == CSV_FORMAT:
+            return f"{BULK_ERROR_MARKER},{json.dumps(message)}\n".encode()
+        return (json.dumps({BULK_ERROR_MARKER: message}) + "\n").encode()
+
+    async def predict_chunks(
+        self, chunks: Iterator[DataFrame], output_format: str
+    ) -> AsyncIterator[bytes]:
+
+        """
+        Method Name :   predict_chunks
+
+        Description :   This method scores every chunk with one vectorized predict call on the inference pool,
+                        so bulk scoring shares its workers and limits, and encodes the predictions in the same
+                        format as the upload. The response status is sent before the first chunk is scored,
+                        so an error while streaming ends the output with an error line instead: a CSV row
+                        whose first field is #error, or an NDJSON record with an "#error" key, followed by
+                        the error message.
+
+        Output      :   Async iterator of encoded prediction chunks
+        """
+        logger.info("Entered predict_chunks method of BulkPredictor class")
+        row_offset = 0
+        try:
+            for chunk_number in itertools.count():
+                # Parsing the upload blocks, it is kept off the event loop
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    break
+                cost_values = await self.inference_pool.run("predict", chunk)
+
+                result = pd.DataFrame(
+                    {"row": range(row_offset, row_offset + len(chunk))}
+                )
+                if BULK_PREDICT_ID_COLUMN in chunk.columns:
+                    result[BULK_PREDICT_ID_COLUMN] = chunk[BULK_PREDICT_ID_COLUMN].values
+                result[TARGET_COLUMN] = cost_values.round(2)
+                row_offset += len(chunk)
+
+                if output_format == CSV_FORMAT:
+                    yield result.to_csv(index=False, header=chunk_number == 0).encode()
+                else:
+                    lines = result.to_json(orient="records", lines=True)
+                    yield (lines if lines.endswith("\n") else lines + "\n").encode()
+
+            logger.info(f"Scored {row_offset} rows in bulk")
+            logger.info("Exited predict_chunks method of BulkPredictor class")
+
+        except Exception as e:
+            logger.error(f"Bulk scoring failed after {row_offset} rows: {e}")
+            yield self.get_error_line(e, output_format)
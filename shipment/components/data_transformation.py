@@ -8,6 +8,7 @@ import pandas as pd
 from category_encoders.binary import BinaryEncoder
 from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import OneHotEncoder,StandardScaler
+from shipment.components.feature_encoder import FeatureEncoder
 from shipment.entity.config_entity import DataTransformationConfig
 from shipment.entity.artifact_entity import (
     DataIngestionArtifacts,
@@ -30,18 +31,20 @@ class DataTransformation:
         self.test_set = pd.read_csv(self.data_ingestion_artifacts.test_data_file_path)
 
 
-    def get_data_transformer_object(self) -> object:
+    # This is static method so the preprocessor can be built without reading the ingested data
+    @staticmethod
+    def get_data_transformer_object(data_transformation_config: DataTransformationConfig) -> object:
         logging.info("Entered get_data_transformer_object method of Data_Ingestion class.")
         try:
             # getting the required columns from the schema.yaml file:
             # numerical columns
-            numerical_columns = self.data_transformation_config.SCHEMA_CONFIG["numerical_columns"]
+            numerical_columns = data_transformation_config.SCHEMA_CONFIG["numerical_columns"]
             
             # categorical columns to onehot encode
-            onehot_columns = self.data_transformation_config.SCHEMA_CONFIG["onehot_columns"]
+            onehot_columns = data_transformation_config.SCHEMA_CONFIG["onehot_columns"]
 
             # binary columns
-            binary_columns = self.data_transformation_config.SCHEMA_CONFIG["binary_columns"]
+            binary_columns = data_transformation_config.SCHEMA_CONFIG["binary_columns"]
 
             logging.info("Got numerical columns, categorical cols to onehot encode and binary columns")
 
@@ -111,7 +114,7 @@ class DataTransformation:
             logging.info("Created artifacts directory for Data Transformation")
 
             # Getting preprocessor object
-            preprocessor = self.get_data_transformer_object()
+            preprocessor = self.get_data_transformer_object(self.data_transformation_config)
             logging.info("Got the preprocessor object")
 
             # Getting target column name from schema file
@@ -177,13 +180,25 @@ class DataTransformation:
                 self.data_transformation_config.PREPROCESSOR_FILE_PATH, preprocessor
             )
             logging.info("Saved the preprocessor object in DataTransformation artifacts directory.")
+
+            # Compiling the fitted preprocessor into a fast feature encoder, exported only if it reproduces the preprocessor exactly
+            feature_encoder_file = None
+            feature_encoder = FeatureEncoder.from_preprocessor(preprocessor)
+            if feature_encoder.matches_preprocessor(preprocessor, input_feature_test_df):
+                feature_encoder_file = self.data_transformation_config.UTILS.save_object(
+                    self.data_transformation_config.FEATURE_ENCODER_FILE_PATH, feature_encoder
+                )
+                logging.info("Saved the feature encoder object in DataTransformation artifacts directory.")
+            else:
+                logging.info("Feature encoder output differs from the preprocessor, not exporting it.")
             logging.info("Exited initiate_data_transformation method of Data_Transformation class")
 
             # Saving data transformation artifacts
             data_transformation_artifacts = DataTransformationArtifacts(
                 transformed_object_file_path=preprocessor_obj_file,
                 transformed_train_file_path=transformed_train_file,
-                transformed_test_file_path=transformed_test_file
+                transformed_test_file_path=transformed_test_file,
+                feature_encoder_file_path=feature_encoder_file
             )
 
             return data_transformation_artifacts
@@ -0,0 +1,381 @@
+import sys
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from shipment.exception import ShippingException
+from shipment.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class CategoricalBlock:
+    def __init__(
+        self,
+        column: str,
+        offset: int,
+        categories: Sequence,
+        table: np.ndarray,
+        unknown_row: Optional[np.ndarray],
+        missing_row: Optional[np.ndarray],
+    ):
+        # Rows of the table are [categories..., unknown, missing], a policy that raises has no row
+        unknown_index = missing_index = -1
+        rows = [table]
+        if unknown_row is not None:
+            unknown_index = len(categories)
+            rows.append(unknown_row.reshape(1, -1))
+        if missing_row is not None:
+            missing_index = len(categories) + len(rows) - 1
+            rows.append(missing_row.reshape(1, -1))
+        self._set_table(
+            column, offset, categories, np.vstack(rows).astype(np.float64), unknown_index, missing_index
+        )
+
+    def _set_table(
+        self,
+        column: str,
+        offset: int,
+        categories: Sequence,
+        table: np.ndarray,
+        unknown_index: int,
+        missing_index: int,
+    ) -> None:
+        self.column = column
+        self.offset = offset
+        self.width = table.shape[1]
+        self.categories = list(categories)
+        self.lookup: Dict[object, int] = {
+            category: index for index, category in enumerate(self.categories)
+        }
+        self.index = pd.Index(self.categories)
+        self.table = table
+        self.unknown_index = unknown_index
+        self.missing_index = missing_index
+
+    @classmethod
+    def from_stacked_table(
+        cls,
+        column: str,
+        offset: int,
+        categories: Sequence,
+        table: np.ndarray,
+        unknown_index: int,
+        missing_index: int,
+    ) -> "CategoricalBlock":
+        """Rebuilds a block around a table already stacked as [categories..., unknown, missing], without
+        copying it, so a memory-mapped table stays shared."""
+        block = cls.__new__(cls)
+        block._set_table(column, offset, categories, table, unknown_index, missing_index)
+        return block
+
+    def _unknown_error(self, values) -> ValueError:
+        return ValueError(
+            f"Found unknown categories {sorted(map(str, set(values)))} in column {self.column!r} during transform"
+        )
+
+    def get_row_index(self, value) -> int:
+        index = self.lookup.get(value)
+        if index is not None:
+            return index
+
+        if value is None or (isinstance(value, float) and value != value):
+            if self.missing_index < 0:
+                raise self._unknown_error([value])
+            return self.missing_index
+
+        if self.unknown_index < 0:
+            raise self._unknown_error([value])
+        return self.unknown_index
+
+    def get_row_indices(self, values: np.ndarray) -> np.ndarray:
+        indices = self.index.get_indexer(values)
+        not_found = indices < 0
+        if not not_found.any():
+            return indices
+
+        missing = not_found & pd.isna(values)
+        unknown = not_found & ~missing
+        if missing.any():
+            if self.missing_index < 0:
+                raise self._unknown_error(values[missing])
+            indices[missing] = self.missing_index
+        if unknown.any():
+            if self.unknown_index < 0:
+                raise self._unknown_error(values[unknown])
+            indices[unknown] = self.unknown_index
+        return indices
+
+
+class FeatureEncoder:
+    def __init__(
+        self,
+        n_features: int,
+        blocks: List[CategoricalBlock],
+        numeric_columns: List[str],
+        numeric_offsets: np.ndarray,
+        mean: np.ndarray,
+        scale: np.ndarray,
+    ):
+        self.n_features = n_features
+        self.blocks = blocks
+        self.numeric_columns = numeric_columns
+        self.numeric_offsets = numeric_offsets
+        self.mean = mean
+        self.scale = scale
+
+    @property
+    def input_columns(self) -> List[str]:
+        columns = [block.column for block in self.blocks] + list(self.numeric_columns)
+        return list(dict.fromkeys(columns))
+
+    @classmethod
+    def from_preprocessor(cls, preprocessor) -> "FeatureEncoder":
+
+        """
+        Method Name :   from_preprocessor
+
+        Description :   This method compiles the fitted ColumnTransformer into category lookup tables at fixed
+                        column offsets and the scaler mean/scale arrays. Only the OneHotEncoder,
+                        BinaryEncoder and StandardScaler layout used by DataTransformation is supported.
+
+        Output      :   FeatureEncoder
+        """
+        logger.info("Entered from_preprocessor method of FeatureEncoder class")
+        try:
+            blocks: List[CategoricalBlock] = []
+            numeric_columns: List[str] = []
+            numeric_offsets: List[int] = []
+            means: List[np.ndarray] = []
+            scales: List[np.ndarray] = []
+
+            for name, transformer, columns in preprocessor.transformers_:
+                output_slice = preprocessor.output_indices_[name]
+                if name == "remainder":
+                    if transformer != "drop" and output_slice.stop > output_slice.start:
+                        raise ValueError("Only remainder='drop' is supported")
+                    continue
+
+                kind = type(transformer).__name__
+                if kind == "OneHotEncoder":
+                    blocks.extend(
+                        cls._compile_one_hot(transformer, columns, output_slice.start)
+                    )
+                elif kind == "BinaryEncoder":
+                    blocks.extend(
+                        cls._compile_binary(transformer, columns, output_slice.start)
+                    )
+                elif kind == "StandardScaler":
+                    n = len(columns)
+                    numeric_columns.extend(columns)
+                    numeric_offsets.extend(range(output_slice.start, output_slice.start + n))
+                    means.append(
+                        transformer.mean_ if transformer.with_mean else np.zeros(n)
+                    )
+                    scales.append(
+                        transformer.scale_ if transformer.with_std else np.ones(n)
+                    )
+                else:
+                    raise ValueError(f"Unsupported transformer {kind} in preprocessor")
+
+            n_features = max(s.stop for s in preprocessor.output_indices_.values())
+            feature_encoder = cls(
+                n_features=n_features,
+                blocks=blocks,
+                numeric_columns=numeric_columns,
+                numeric_offsets=np.array(numeric_offsets, dtype=np.intp),
+                mean=np.concatenate(means) if means else np.zeros(0),
+                scale=np.concatenate(scales) if scales else np.ones(0),
+            )
+            logger.info("Exited from_preprocessor method of FeatureEncoder class")
+            return feature_encoder
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+    @staticmethod
+    def _compile_one_hot(ohe, columns: List[str], offset: int) -> List[CategoricalBlock]:
+        if getattr(ohe, "drop_idx_", None) is not None or getattr(ohe, "_infrequent_enabled", False):
+            raise ValueError("OneHotEncoder with drop or infrequent categories is not supported")
+
+        ignore_unknown = ohe.handle_unknown != "error"
+        blocks = []
+        for column, categories in zip(columns, ohe.categories_):
+            n = len(categories)
+            zeros = np.zeros(n)
+            nan_positions = [i for i, c in enumerate(categories) if c is None or c != c]
+            blocks.append(
+                CategoricalBlock(
+                    column=column,
+                    offset=offset,
+                    categories=categories,
+                    table=np.eye(n),
+                    unknown_row=zeros if ignore_unknown else None,
+                    # A missing value is only valid if it was seen as a category during fit
+                    missing_row=np.eye(n)[nan_positions[0]] if nan_positions else (zeros if ignore_unknown else None),
+                )
+            )
+            offset += n
+        return blocks
+
+    @staticmethod
+    def _compile_binary(binary_encoder, columns: List[str], offset: int) -> List[CategoricalBlock]:
+        if binary_encoder.drop_invariant:
+            raise ValueError("BinaryEncoder with drop_invariant is not supported")
+
+        ordinal_mappings = {m["col"]: m["mapping"] for m in binary_encoder.ordinal_encoder.mapping}
+        blocks = []
+        for mapping in binary_encoder.mapping:
+            column, digits = mapping["col"], mapping["mapping"]
+            ordinals = ordinal_mappings[column]
+            categories = [c for c in ordinals.index if not pd.isna(c)]
+            table = digits.loc[[ordinals[c] for c in categories]].to_numpy()
+
+            unknown_row = (
+                digits.loc[-1].to_numpy() if binary_encoder.handle_unknown == "value" else None
+            )
+            missing_row = (
+                digits.loc[-2].to_numpy() if binary_encoder.handle_missing == "value" else None
+            )
+            blocks.append(
+                CategoricalBlock(column, offset, categories, table, unknown_row, missing_row)
+            )
+            offset += table.shape[1]
+        return blocks
+
+    def transform_records(self, records: List[Dict], out: np.ndarray = None) -> np.ndarray:
+
+        """
+        Method Name :   transform_records
+
+        Description :   This method encodes records keyed by input column straight into a numpy buffer,
+                        without building a dataframe. out can be passed to reuse a preallocated buffer.
+
+        Output      :   Array of shape (len(records), n_features)
+        """
+        n = len(records)
+        if out is None:
+            out = np.empty((n, self.n_features), dtype=np.float64)
+
+        for block in self.blocks:
+            column, lookup = block.column, block.get_row_index
+            indices = [lookup(record[column]) for record in records]
+            out[:n, block.offset:block.offset + block.width] = block.table[indices]
+
+        if self.numeric_columns:
+            numeric = np.array(
+                [[record[column] for column in self.numeric_columns] for record in records],
+                dtype=np.float64,
+            )
+            numeric -= self.mean
+            numeric /= self.scale
+            out[:n, self.numeric_offsets] = numeric
+
+        return out[:n]
+
+    def transform_frame(self, X: DataFrame) -> np.ndarray:
+
+        """
+        Method Name :   transform_frame
+
+        Description :   This method encodes a dataframe column by column with vectorized table lookups. It gives
+                        the same output as the preprocessor's transform.
+
+        Output      :   Array of shape (len(X), n_features)
+        """
+        out = np.empty((len(X), self.n_features), dtype=np.float64)
+
+        for block in self.blocks:
+            indices = block.get_row_indices(X[block.column].to_numpy(dtype=object))
+            out[:, block.offset:block.offset + block.width] = block.table[indices]
+
+        if self.numeric_columns:
+            numeric = X[self.numeric_columns].to_numpy(dtype=np.float64)
+            numeric -= self.mean
+            numeric /= self.scale
+            out[:, self.numeric_offsets] = numeric
+
+        return out
+
+    def transform_encoded(
+        self,
+        categorical: Dict[str, Tuple[np.ndarray, np.ndarray]],
+        numeric: Dict[str, np.ndarray],
+        n_rows: int,
+    ) -> np.ndarray:
+
+        """
+        Method Name :   transform_encoded
+
+        Description :   This method encodes dictionary-encoded columns, given as (codes, categories) pairs with
+                        code -1 for a missing value. Each distinct category is looked up once and the rows
+                        are filled with a vectorized take, so no Python object is built per row.
+
+        Output      :   Array of shape (n_rows, n_features)
+        """
+        out = np.empty((n_rows, self.n_features), dtype=np.float64)
+
+        for block in self.blocks:
+            codes, categories = categorical[block.column]
+            # Only the categories some row uses are looked up, an unused unknown one must not raise
+            used = np.bincount(codes + 1, minlength=len(categories) + 1) > 0
+            category_rows = np.zeros(len(categories) + 1, dtype=np.intp)
+            used_categories = np.flatnonzero(used[1:])
+            category_rows[used_categories] = block.get_row_indices(
+                np.asarray(categories, dtype=object)[used_categories]
+            )
+            if used[0]:
+                if block.missing_index < 0:
+                    raise block._unknown_error([None])
+                category_rows[-1] = block.missing_index
+            out[:, block.offset:block.offset + block.width] = block.table[category_rows[codes]]
+
+        if self.numeric_columns:
+            values = np.column_stack(
+                [np.asarray(numeric[column], dtype=np.float64) for column in self.numeric_columns]
+            )
+            values -= self.mean
+            values /= self.scale
+            out[:, self.numeric_offsets] = values
+
+        return out
+
+    def fold_contributions(self, contributions: np.ndarray) -> np.ndarray:
+
+        """
+        Method Name :   fold_contributions
+
+        Description :   This method sums per-feature contributions of the encoded features back into the input
+                        column each one was encoded from, so the one-hot and binary digits of a category
+                        add up to the contribution of that column.
+
+        Output      :   Array of shape (len(contributions), len(input_columns))
+        """
+        columns = self.input_columns
+        column_index = {column: i for i, column in enumerate(columns)}
+        fold = np.zeros((self.n_features, len(columns)), dtype=np.float64)
+        for block in self.blocks:
+            fold[block.offset:block.offset + block.width, column_index[block.column]] = 1.0
+        for offset, column in zip(self.numeric_offsets, self.numeric_columns):
+            fold[offset, column_index[column]] = 1.0
+        return np.asarray(contributions, dtype=np.float64) @ fold
+
+    def matches_preprocessor(self, preprocessor, X: DataFrame) -> bool:
+
+        """
+        Method Name :   matches_preprocessor
+
+        Description :   This method checks that the encoder reproduces preprocessor.transform exactly on X.
+
+        Output      :   True or False
+        """
+        expected = preprocessor.transform(X)
+        if hasattr(expected, "toarray"):
+            expected = expected.toarray()
+
+        return bool(
+            np.array_equal(self.transform_frame(X), expected, equal_nan=True)
+            and np.array_equal(
+                self.transform_records(X.to_dict(orient="records")), expected, equal_nan=True
+            )
+        )
@@ -0,0 +1,206 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+from shipment.constant import *
+from shipment.components.model_predictor import CostPredictor
+from shipment.exception import InferenceQueueFullException, InferenceTimeoutException
+from shipment.logger import get_logger
+from shipment.utils.metrics import REGISTRY, capture_stage_timings, record_stage_timings
+
+logger = get_logger(__name__)
+
+
+THREAD_POOL = "thread"
+PROCESS_POOL = "process"
+
+POOL_QUEUE_DEPTH = REGISTRY.gauge(
+    "shipment_inference_pool_queue_depth",
+    "Inference jobs submitted to the worker pool that have not finished yet",
+)
+POOL_REJECTED = REGISTRY.counter(
+    "shipment_inference_pool_rejected_total",
+    "Inference jobs rejected by the worker pool",
+    ["reason"],
+)
+
+
+# Each process worker keeps its own warm CostPredictor, and through it its own resident model
+_worker_cost_predictor: Optional[CostPredictor] = None
+# Reload generation the worker's model was last refreshed for
+_worker_reload_generation = 0
+
+
+def _init_process_worker() -> None:
+    global _worker_cost_predictor
+    _worker_cost_predictor = CostPredictor()
+    _worker_cost_predictor.model_holder.get_model()
+    logger.info("Loaded resident model in inference worker process")
+
+
+def _run_timed(function, *args):
+    # Timed in the worker, so the time excludes the wait for a free worker
+    started_at = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started_at
+
+
+def _run_in_process_worker(reload_generation: int, reload_force: bool, method_name: str, *args):
+    global _worker_reload_generation
+    # A reload was requested since this worker's last job, every job carries the generation so each worker
+    # refreshes its own model before it next scores
+    if reload_generation != _worker_reload_generation:
+        _worker_reload_generation = reload_generation
+        try:
+            _worker_cost_predictor.model_holder.refresh(force=reload_force)
+        except Exception as e:
+            logger.error(f"Reloading the model in inference worker process failed: {e}")
+
+    # Stage timings are sent back with the result, since /metrics is served by the parent process
+    with capture_stage_timings() as timings:
+        result, seconds = _run_timed(getattr(_worker_cost_predictor, method_name), *args)
+    return result, seconds, timings
+
+
+class InferencePool:
+    def __init__(
+        self,
+        cost_predictor: CostPredictor,
+        kind: str = INFERENCE_POOL_KIND,
+        max_workers: int = INFERENCE_POOL_WORKERS,
+        max_queue_depth: int = INFERENCE_POOL_MAX_QUEUE_DEPTH,
+        timeout: float = INFERENCE_TIMEOUT_SECONDS,
+    ):
+        if kind not in (THREAD_POOL, PROCESS_POOL):
+            raise ValueError(f"Unknown inference pool kind {kind!r}, expected 'thread' or 'process'")
+
+        self.cost_predictor = cost_predictor
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self.timeout = timeout
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._reload_generation = 0
+        self._reload_force = False
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def start(self) -> None:
+        if self._executor is not None:
+            return
+
+        if self.kind == PROCESS_POOL:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process_worker,
+            )
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="inference"
+            )
+        logger.info(f"Started {self.kind} inference pool with {self.max_workers} workers")
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def reload_model(self, force: bool = False) -> bool:
+
+        """
+        Method Name :   reload_model
+
+        Description :   This method reloads the served model wherever it is scored. A thread pool shares the
+                        CostPredictor of this process, which is refreshed at once. Process workers each hold
+                        their own model, so the reload generation is bumped instead and every worker refreshes
+                        before its next job, while this process only looks up the new version. It blocks on
+                        S3, async callers run it with asyncio.to_thread.
+
+        Output      :   True if the model changed, or force was set
+        """
+        model_holder = self.cost_predictor.model_holder
+        if self.kind != PROCESS_POOL:
+            return model_holder.refresh(force=force)
+
+        previous_version = model_holder.get_version()
+        with self._pending_lock:
+            self._reload_generation += 1
+            self._reload_force = force
+        version = model_holder.refresh_version()
+        logger.info(f"Requested model reload generation {self._reload_generation} of the inference workers")
+        return force or version != previous_version
+
+    def _release(self, _) -> None:
+        with self._pending_lock:
+            self._pending -= 1
+        POOL_QUEUE_DEPTH.dec()
+
+    async def run(self, method_name: str, *args):
+
+        """
+        Method Name :   run
+
+        Description :   This method runs the method_name method of CostPredictor on the worker pool so the
+                        event loop stays free. Jobs beyond max_queue_depth pending ones are rejected, and
+                        callers stop waiting after timeout seconds.
+
+        Output      :   Return value of the CostPredictor method
+        """
+        result, _ = await self.run_timed(method_name, *args)
+        return result
+
+    async def run_timed(self, method_name: str, *args) -> Tuple[object, float]:
+
+        """
+        Method Name :   run_timed
+
+        Description :   This method runs method_name like run, and also returns how long the CostPredictor
+                        method itself ran in its worker, without the queueing in front of it.
+
+        Output      :   Tuple of the return value of the CostPredictor method and its run time in seconds
+        """
+        if self._executor is None:
+            self.start()
+
+        with self._pending_lock:
+            if self._pending >= self.max_queue_depth:
+                POOL_REJECTED.inc(reason="queue_full")
+                raise InferenceQueueFullException(
+                    f"Inference pool has {self._pending} pending jobs, limit is {self.max_queue_depth}"
+                )
+            self._pending += 1
+        POOL_QUEUE_DEPTH.inc()
+
+        try:
+            if self.kind == PROCESS_POOL:
+                job = self._executor.submit(
+                    _run_in_process_worker, self._reload_generation, self._reload_force, method_name, *args
+                )
+            else:
+                job = self._executor.submit(_run_timed, getattr(self.cost_predictor, method_name), *args)
+        except Exception:
+            self._release(None)
+            raise
+
+        # The slot is released when the job really finishes, even if the caller stopped waiting
+        job.add_done_callback(self._release)
+
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(job), self.timeout)
+            if self.kind == PROCESS_POOL:
+                result, seconds, timings = result
+                record_stage_timings(timings)
+                return result, seconds
+            return result
+        except asyncio.TimeoutError:
+            POOL_REJECTED.inc(reason="timeout")
+            raise InferenceTimeoutException(
+                f"Inference did not finish within {self.timeout} seconds"
+            )
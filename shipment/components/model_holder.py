@@ -0,0 +1,234 @@
+import hashlib
+import os
+import sys
+import threading
+import time
+from typing import Optional, Tuple
+from shipment.constant import *
+from shipment.configuration.s3_operations import S3Operation
+from shipment.components.mapped_model import MappedCostModel, download_mapped_model
+from shipment.exception import ShippingException
+from shipment.logger import get_logger
+from shipment.utils.main_utils import MainUtils
+from shipment.utils.metrics import REGISTRY
+
+logger = get_logger(__name__)
+
+
+MODEL_LOAD_SECONDS = REGISTRY.histogram(
+    "shipment_model_load_seconds",
+    "Time to download and deserialize the model from s3 bucket",
+)
+
+PICKLE_ARTIFACT = "pickle"
+MAPPED_ARTIFACT = "mapped"
+
+
+
+class ModelHolder:
+    def __init__(
+        self,
+        model_name: str = None,
+        bucket_name: str = BUCKET_NAME,
+        reload_interval: float = MODEL_RELOAD_INTERVAL_SECONDS,
+        s3: S3Operation = None,
+        artifact_format: str = MODEL_ARTIFACT_FORMAT,
+        local_path: str = LOCAL_MODEL_PATH,
+    ):
+        if artifact_format not in (PICKLE_ARTIFACT, MAPPED_ARTIFACT):
+            raise ValueError(
+                f"Unknown model artifact format {artifact_format!r}, expected 'pickle' or 'mapped'"
+            )
+        if model_name is None:
+            # A mapped model is versioned by its manifest, which is uploaded after the arrays it points to
+            model_name = S3_MAPPED_MODEL_MANIFEST_KEY if artifact_format == MAPPED_ARTIFACT else MODEL_FILE_NAME
+
+        self.artifact_format = artifact_format
+        self.model_name = model_name
+        self.local_path = local_path
+        self.bucket_name = bucket_name
+        self.reload_interval = reload_interval
+        self._s3 = s3
+
+        # (model, etag) is always replaced as a whole, so readers never see a half-loaded model
+        self._state: Optional[Tuple[object, str]] = None
+        # ETag seen by the last HEAD request, for processes that track the version without loading the model
+        self._remote_version: Optional[str] = None
+        self._last_checked = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def s3(self) -> S3Operation:
+        if self._s3 is None:
+            self._s3 = S3Operation()
+        return self._s3
+
+    @property
+    def version(self) -> Optional[str]:
+        state = self._state
+        return None if state is None else state[1]
+
+    def _is_due(self) -> bool:
+        return (
+            self.reload_interval > 0
+            and time.monotonic() - self._last_checked >= self.reload_interval
+        )
+
+    def get_model(self) -> object:
+
+        """
+        Method Name :   get_model
+
+        Description :   This method returns the resident model, loading it on first use. When the reload interval
+                        has elapsed the ETag is revalidated on a background thread, so callers keep using the
+                        current model in the meantime.
+
+        Output      :   Model object
+        """
+        try:
+            state = self._state
+            if state is None:
+                with self._lock:
+                    if self._state is None:
+                        self._load()
+                    state = self._state
+
+            elif self._is_due() and not self._lock.locked():
+                self._last_checked = time.monotonic()
+                threading.Thread(target=self._background_refresh, daemon=True).start()
+
+            return state[0]
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+    def get_version(self) -> Optional[str]:
+
+        """
+        Method Name :   get_version
+
+        Description :   This method returns the version of the resident model without ever blocking. A process
+                        that has not loaded the model, like the parent of a process pool, tracks the S3 ETag
+                        with background HEAD requests instead.
+
+        Output      :   Model version, or None if it is not known yet
+        """
+        state = self._state
+        never_checked = state is None and self._last_checked == 0.0
+        if (self._is_due() or never_checked) and not self._lock.locked():
+            self._last_checked = time.monotonic()
+            target = self._background_refresh if state is not None else self._check_remote_version
+            threading.Thread(target=target, daemon=True).start()
+
+        return state[1] if state is not None else self._remote_version
+
+    def refresh(self, force: bool = False) -> bool:
+
+        """
+        Method Name :   refresh
+
+        Description :   This method revalidates the resident model against the S3 ETag and swaps in the new
+                        model if the object has changed. force reloads the model even when the ETag matches.
+
+        Output      :   True if a new model was swapped in, else False
+        """
+        logger.info("Entered refresh method of ModelHolder class")
+        try:
+            with self._lock:
+                self._last_checked = time.monotonic()
+                if not force and self._state is not None:
+                    etag = self._get_remote_version()
+                    if etag is None or etag == self._state[1]:
+                        logger.info("Resident model is up to date")
+                        return False
+
+                self._load()
+                logger.info("Exited refresh method of ModelHolder class")
+                return True
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+    def _background_refresh(self) -> None:
+        try:
+            self.refresh()
+        except Exception as e:
+            # A failed revalidation keeps serving the current model
+            logger.error(f"Background model refresh failed: {e}")
+
+    def refresh_version(self) -> Optional[str]:
+
+        """
+        Method Name :   refresh_version
+
+        Description :   This method looks up the current S3 ETag of the model without loading it, for a process
+                        that only tracks the version, like the parent of a process pool.
+
+        Output      :   Model version, or None if the model object is not found
+        """
+        try:
+            self._last_checked = time.monotonic()
+            self._remote_version = self._get_remote_version()
+            return self._remote_version
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+    def _check_remote_version(self) -> None:
+        try:
+            self._remote_version = self._get_remote_version()
+        except Exception as e:
+            logger.error(f"Checking the model version failed: {e}")
+
+    def _get_local_file(self) -> str:
+        if self.artifact_format == MAPPED_ARTIFACT:
+            return os.path.join(self.local_path, MAPPED_MODEL_MANIFEST_FILE_NAME)
+        return self.local_path
+
+    def _get_remote_version(self) -> Optional[str]:
+        if not self.local_path:
+            return self.s3.get_object_etag(self.model_name, self.bucket_name)
+
+        # A local model is versioned by the content hash of its file, or of the manifest for a mapped model
+        digest = hashlib.sha256()
+        with open(self._get_local_file(), "rb") as file_obj:
+            for chunk in iter(lambda: file_obj.read(1 << 20), b""):
+                digest.update(chunk)
+        return "local-" + digest.hexdigest()[:16]
+
+    def _load(self) -> None:
+        started_at = time.perf_counter()
+        if self.local_path:
+            etag = self._get_remote_version()
+            model = (
+                MappedCostModel.load(self.local_path)
+                if self.artifact_format == MAPPED_ARTIFACT
+                else MainUtils.load_object(self.local_path)
+            )
+        elif self.artifact_format == MAPPED_ARTIFACT:
+            model_dir, etag = download_mapped_model(
+                self.s3, self.model_name, self.bucket_name, MAPPED_MODEL_CACHE_DIR
+            )
+            model = MappedCostModel.load(model_dir)
+        else:
+            model, etag = self.s3.load_model_with_etag(self.model_name, self.bucket_name)
+        MODEL_LOAD_SECONDS.observe(time.perf_counter() - started_at)
+        self._state = (model, etag)
+        self._last_checked = time.monotonic()
+        source = self.local_path or "s3 bucket"
+        logger.info(f"Loaded model {self.model_name} with ETag {etag} from {source}")
+
+
+
+_model_holder: Optional[ModelHolder] = None
+_model_holder_lock = threading.Lock()
+
+
+def get_model_holder() -> ModelHolder:
+    """Returns the process-wide ModelHolder, creating it on first use."""
+    global _model_holder
+    if _model_holder is None:
+        with _model_holder_lock:
+            if _model_holder is None:
+                _model_holder = ModelHolder()
+    return _model_holder
@@ -1,15 +1,46 @@
-from shipment.logger import logging
+from shipment.logger import get_logger
 import sys
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
 from pandas import DataFrame
 import pandas as pd
 from shipment.constant import *
-from shipment.configuration.s3_operations import S3Operation
-from shipment.exception import ShippingException
+from shipment.components.arrow_codec import ArrowBatchCodec
+from shipment.components.feature_encoder import FeatureEncoder
+from shipment.components.model_holder import ModelHolder, get_model_holder
+from shipment.components.model_registry import ModelRegistry
+from shipment.components.tree_explainer import Explanation
+from shipment.exception import (
+    ExplanationNotSupportedException,
+    ModelVersionNotFoundException,
+    ShippingException,
+)
+from shipment.utils.main_utils import MainUtils
+from shipment.utils.metrics import time_stage
+
+logger = get_logger(__name__)
 
 
 
 class shippingData:
+    # Maps the request field names to the input columns expected by the preprocessor
+    FIELD_COLUMNS = {
+        "artist": "Artist Reputation",
+        "height": "Height",
+        "width": "Width",
+        "weight": "Weight",
+        "material": "Material",
+        "priceOfSculpture": "Price Of Sculpture",
+        "baseShippingPrice": "Base Shipping Price",
+        "international": "International",
+        "expressShipment": "Express Shipment",
+        "installationIncluded": "Installation Included",
+        "transport": "Transport",
+        "fragile": "Fragile",
+        "customerInformation": "Customer Information",
+        "remoteLocation": "Remote Location",
+    }
+
     def __init__(
         self,
         artist,
@@ -52,32 +83,35 @@ class shippingData:
         
         Output      :    Input data in dictionary
         """
-        logging.info("Entered get_data method of SensorData class")
+        logger.info("Entered get_data method of SensorData class")
         try:
             # Saving the features as dictionary
             input_data = {
-                "Artist Reputation": [self.artist],
-                "Height": [self.height],
-                "Width": [self.width],
-                "Weight": [self.weight],
-                "Material": [self.material],
-                "Price Of Sculpture": [self.priceOfSculpture],
-                "Base Shipping Price": [self.baseShippingPrice],
-                "International": [self.international],
-                "Express Shipment": [self.expressShipment],
-                "Installation Included": [self.installationIncluded],
-                "Transport": [self.transport],
-                "Fragile": [self.fragile],
-                "Customer Information": [self.customerInformation],
-                "Remote Location": [self.remoteLocation],
+                column: [getattr(self, field)]
+                for field, column in self.FIELD_COLUMNS.items()
             }
 
-            logging.info("Exited get_data method of SensorData class")
+            logger.info("Exited get_data method of SensorData class")
             return input_data
 
         except Exception as e:
             raise ShippingException(e, sys)
 
+    def get_record(self) -> Dict:
+
+        """
+        Method Name :   get_record
+
+        Description :   This method gets data as a single record keyed by input column, so several
+                        shipments can be combined into one dataframe.
+
+        Output      :   Input data in dictionary
+        """
+        return {
+            column: getattr(self, field)
+            for field, column in self.FIELD_COLUMNS.items()
+        }
+
     def get_input_data_frame(self) -> DataFrame:
 
         """
@@ -87,29 +121,81 @@ class shippingData:
         
         Output      :    DataFrame 
         """
-        logging.info(
+        logger.info(
             "Entered get_input_data_frame method of  class"
         )
         try:
             # Getting the data in dictionary format
             input_dict = self.get_data()
 
-            logging.info("Got data as dict")
-            logging.info(
+            logger.info("Got data as dict")
+            logger.info(
                 "Exited get_input_data_frame method of  class"
             )
-            return pd.DataFrame(input_dict)
+            with time_stage("dataframe_build"):
+                return pd.DataFrame(input_dict)
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+
+    @classmethod
+    def get_batch_data_frame(cls, shipments: List[Dict]) -> DataFrame:
+
+        """
+        Method Name :   get_batch_data_frame
+
+        Description :   This method converts a list of shipments, keyed by the request field names, into a
+                        single dataframe so the whole batch is transformed and predicted in one call.
+
+        Output      :   DataFrame
+        """
+        logger.info("Entered get_batch_data_frame method of shippingData class")
+        try:
+            input_data = {
+                column: [shipment.get(field) for shipment in shipments]
+                for field, column in cls.FIELD_COLUMNS.items()
+            }
+
+            logger.info("Exited get_batch_data_frame method of shippingData class")
+            return pd.DataFrame(input_data)
 
         except Exception as e:
             raise ShippingException(e, sys) from e
 
 
 class CostPredictor:
-    def __init__(self):
-        self.s3 = S3Operation()
+    def __init__(self, model_holder: ModelHolder = None, model_registry: ModelRegistry = None):
+        self.model_holder = model_holder if model_holder is not None else get_model_holder()
+        self._model_registry = model_registry
         self.bucket_name = BUCKET_NAME
+        self._arrow_codec: Optional[ArrowBatchCodec] = None
+
+    @property
+    def model_registry(self) -> ModelRegistry:
+        if self._model_registry is None:
+            self._model_registry = ModelRegistry(
+                model_name=self.model_holder.model_name,
+                bucket_name=self.model_holder.bucket_name,
+                artifact_format=self.model_holder.artifact_format,
+            )
+        return self._model_registry
 
-    def predict(self, X) -> float:
+    def get_model(self, model_version: Optional[str] = None) -> object:
+
+        """
+        Method Name :   get_model
+
+        Description :   This method returns the resident best model, or the pinned model_version of it from the
+                        model registry. Pinning the version the holder already serves uses the holder's model.
+
+        Output      :   Model object
+        """
+        if model_version is None or model_version == self.model_holder.version:
+            return self.model_holder.get_model()
+        return self.model_registry.get_model(model_version)
+
+    def predict(self, X, model_version: Optional[str] = None) -> float:
 
         """
         Method Name :   predict
@@ -118,16 +204,237 @@ class CostPredictor:
         
         Output      :   Predictions 
         """
-        logging.info("Entered predict method of the class")
+        logger.info("Entered predict method of the class")
         try:
-            # Loading the best model from s3 bucket
-            best_model = self.s3.load_model(MODEL_FILE_NAME, self.bucket_name)
-            logging.info("Loaded best model from s3 bucket")
+            # Getting the resident best model, loaded from s3 bucket once per process
+            with time_stage("model_fetch"):
+                best_model = self.get_model(model_version)
+            logger.info("Got resident best model")
 
             # Predicting with best model
             result = best_model.predict(X)
-            logging.info("Exited predict method of the class")
+            logger.info("Exited predict method of the class")
             return result
 
+        except ModelVersionNotFoundException:
+            raise
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+    def predict_records(self, records: List[Dict], model_version: Optional[str] = None):
+
+        """
+        Method Name :   predict_records
+
+        Description :   This method predicts a list of shipment records keyed by input column.
+
+        Output      :   Predictions
+        """
+        logger.info("Entered predict_records method of the class")
+        try:
+            with time_stage("model_fetch"):
+                best_model = self.get_model(model_version)
+
+            # Models without predict_records are scored through a dataframe
+            if hasattr(best_model, "predict_records"):
+                return best_model.predict_records(records)
+
+            with time_stage("dataframe_build"):
+                X = pd.DataFrame.from_records(records)
+            return best_model.predict(X)
+
+        except ModelVersionNotFoundException:
+            raise
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+    def predict_arrow(self, body: bytes, model_version: Optional[str] = None) -> bytes:
+
+        """
+        Method Name :   predict_arrow
+
+        Description :   This method predicts the shipments of an Arrow IPC stream and returns the predictions as
+                        an Arrow IPC stream. Columns go to the model dictionary-encoded, without a dataframe.
+
+        Output      :   Arrow IPC stream bytes
+        """
+        logger.info("Entered predict_arrow method of the class")
+        try:
+            with time_stage("arrow_decode"):
+                columns = self.get_arrow_codec().read_columns(body)
+
+            with time_stage("model_fetch"):
+                best_model = self.get_model(model_version)
+
+            predictions = best_model.predict_encoded(columns.categorical, columns.numeric, columns.n_rows)
+
+            with time_stage("arrow_encode"):
+                return self.get_arrow_codec().write_predictions(predictions, columns.ids)
+
+        except ModelVersionNotFoundException:
+            raise
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+    def get_arrow_codec(self) -> ArrowBatchCodec:
+        if self._arrow_codec is None:
+            self._arrow_codec = ArrowBatchCodec(list(shippingData.FIELD_COLUMNS.values()))
+        return self._arrow_codec
+
+    def predict_shipments(self, shipments: List[Dict], model_version: Optional[str] = None):
+
+        """
+        Method Name :   predict_shipments
+
+        Description :   This method predicts a list of shipments keyed by the request field names.
+
+        Output      :   Predictions
+        """
+        with time_stage("dataframe_build"):
+            X = shippingData.get_batch_data_frame(shipments)
+        return self.predict(X=X, model_version=model_version)
+
+    def explain_records(
+        self, records: List[Dict], model_version: Optional[str] = None
+    ) -> Tuple[np.ndarray, Explanation]:
+
+        """
+        Method Name :   explain_records
+
+        Description :   This method predicts records keyed by input column together with the contribution of
+                        each input column to every prediction.
+
+        Output      :   Tuple of predictions and Explanation
+        """
+        logger.info("Entered explain_records method of the class")
+        try:
+            with time_stage("model_fetch"):
+                best_model = self.get_model(model_version)
+
+            explanation = best_model.explain_records(records)
+            return explanation.predictions, explanation
+
+        except (ModelVersionNotFoundException, ExplanationNotSupportedException):
+            raise
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+    def explain_shipments(
+        self, shipments: List[Dict], model_version: Optional[str] = None
+    ) -> Tuple[np.ndarray, Explanation]:
+
+        """
+        Method Name :   explain_shipments
+
+        Description :   This method predicts and explains a list of shipments keyed by the request field names.
+
+        Output      :   Tuple of predictions and Explanation
+        """
+        logger.info("Entered explain_shipments method of the class")
+        try:
+            with time_stage("dataframe_build"):
+                X = shippingData.get_batch_data_frame(shipments)
+
+            with time_stage("model_fetch"):
+                best_model = self.get_model(model_version)
+            explanation = best_model.explain(X)
+            return explanation.predictions, explanation
+
+        except (ModelVersionNotFoundException, ExplanationNotSupportedException):
+            raise
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+    def get_categorical_domains(self, model_version: Optional[str] = None) -> Dict[str, Dict]:
+
+        """
+        Method Name :   get_categorical_domains
+
+        Description :   This method reads the categories each categorical input column was fitted with from the
+                        model's encoder, and whether the column may be missing. A model without a compiled
+                        encoder has its preprocessor compiled for this.
+
+        Output      :   Dict of column to {"categories": [...], "nullable": bool}
+        """
+        try:
+            best_model = self.get_model(model_version)
+            feature_encoder = getattr(best_model, "feature_encoder", None)
+            if feature_encoder is None:
+                feature_encoder = FeatureEncoder.from_preprocessor(best_model.preprocessing_object)
+
+            domains = {}
+            for block in feature_encoder.blocks:
+                domains[block.column] = {
+                    "categories": [str(c) for c in block.categories if not pd.isna(c)],
+                    "nullable": block.missing_index >= 0,
+                }
+            return domains
+
+        except ModelVersionNotFoundException:
+            raise
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+    @staticmethod
+    def get_synthetic_record(best_model: object) -> Dict:
+
+        """
+        Method Name :   get_synthetic_record
+
+        Description :   This method builds a synthetic shipment from the column types in the schema file.
+                        Numerical columns get 0.0 and categorical columns get a category the fitted
+                        preprocessor knows, so the record is valid for the model.
+
+        Output      :   Record keyed by input column
+        """
+        schema_config = MainUtils().read_yaml_file(filename=SCHEMA_FILE_PATH)
+        column_types = {
+            column: dtype
+            for column_type in schema_config["columns"]
+            for column, dtype in column_type.items()
+        }
+
+        known_categories = {}
+        feature_encoder = getattr(best_model, "feature_encoder", None)
+        if feature_encoder is not None:
+            for block in feature_encoder.blocks:
+                known_categories.setdefault(block.column, block.categories[0])
+        else:
+            for _, transformer, columns in best_model.preprocessing_object.transformers_:
+                for column, categories in zip(columns, getattr(transformer, "categories_", [])):
+                    known_categories.setdefault(column, categories[0])
+
+        return {
+            column: 0.0 if column_types[column].startswith("float") else known_categories.get(column, "")
+            for column in shippingData.FIELD_COLUMNS.values()
+        }
+
+    def warmup(self) -> Optional[str]:
+
+        """
+        Method Name :   warmup
+
+        Description :   This method loads the model and scores a synthetic shipment through both the record
+                        and the dataframe paths, so the first real request does not pay for first-call setup.
+
+        Output      :   Version of the warmed up model
+        """
+        logger.info("Entered warmup method of the class")
+        try:
+            best_model = self.model_holder.get_model()
+            record = self.get_synthetic_record(best_model)
+
+            self.predict_records([record])
+            self.predict(X=pd.DataFrame.from_records([record]))
+
+            logger.info(f"Warmed up model version {self.model_holder.version}")
+            return self.model_holder.version
+
         except Exception as e:
             raise ShippingException(e, sys) from e
@@ -1,5 +1,8 @@
+import json
+import os
 import sys
 from shipment.configuration.s3_operations import S3Operation
+from shipment.constant import MAPPED_MODEL_MANIFEST_FILE_NAME
 from shipment.entity.artifact_entity import (
     DataTransformationArtifacts,
     ModelPusherArtifacts,
@@ -45,6 +48,27 @@ class ModelPusher:
                 remove=False,
             )
             logging.info("Uploaded best model to s3 bucket")
+
+            # Uploading the mapped model, arrays first so the manifest never points to a missing file
+            mapped_model_dir = self.model_trainer_artifacts.mapped_model_dir
+            if mapped_model_dir is not None:
+                manifest_path = os.path.join(mapped_model_dir, MAPPED_MODEL_MANIFEST_FILE_NAME)
+                with open(manifest_path) as file_obj:
+                    arrays_file = json.load(file_obj)["arrays_file"]
+                s3_prefix = self.model_pusher_config.S3_MAPPED_MODEL_MANIFEST_KEY.rsplit("/", 1)[0]
+                self.s3.upload_file(
+                    os.path.join(mapped_model_dir, arrays_file),
+                    s3_prefix + "/" + arrays_file,
+                    self.model_pusher_config.BUCKET_NAME,
+                    remove=False,
+                )
+                self.s3.upload_file(
+                    manifest_path,
+                    self.model_pusher_config.S3_MAPPED_MODEL_MANIFEST_KEY,
+                    self.model_pusher_config.BUCKET_NAME,
+                    remove=False,
+                )
+                logging.info("Uploaded mapped model to s3 bucket")
             logging.info("Exited initiate_model_pusher method of ModelTrainer class")
 
             # Saving the model pusher artifacts
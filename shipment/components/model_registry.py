@@ -0,0 +1,261 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from shipment.constant import *
+from shipment.configuration.s3_operations import S3Operation
+from shipment.components.mapped_model import MappedCostModel, download_mapped_model
+from shipment.components.model_holder import MAPPED_ARTIFACT, PICKLE_ARTIFACT
+from shipment.exception import ModelVersionNotFoundException, ShippingException
+from shipment.logger import get_logger
+from shipment.utils.metrics import REGISTRY
+
+logger = get_logger(__name__)
+
+
+REGISTRY_MODELS = REGISTRY.gauge(
+    "shipment_model_registry_models", "Pinned model versions resident in memory"
+)
+REGISTRY_BYTES = REGISTRY.gauge(
+    "shipment_model_registry_bytes", "Estimated memory held by the pinned model versions"
+)
+REGISTRY_EVENTS = REGISTRY.counter(
+    "shipment_model_registry_events_total",
+    "Pinned model version lookups and evictions by event: hit, load, evict or missing",
+    ["event"],
+)
+
+
+# Unknown versions remembered at most, requests choose the versions they pin
+MISSING_VERSIONS_MAX_ENTRIES = 1024
+
+# A loaded XGBoost booster was measured at 1.3 to 1.8 times the size of its raw model
+XGBOOST_MEMORY_FACTOR = 2
+
+
+def get_model_nbytes(model) -> Optional[int]:
+
+    """
+    Method Name :   get_model_nbytes
+
+    Description :   This function estimates the memory a loaded model holds from its tree arrays: the node and
+                    value arrays of scikit-learn trees, the raw booster of XGBoost models times
+                    XGBOOST_MEMORY_FACTOR, and the tables of the feature encoder. Cost models and
+                    segmented models add up the models they hold.
+
+    Output      :   Estimated bytes, None for a model type it cannot measure
+    """
+    if hasattr(model, "trained_model_object"):
+        size = get_model_nbytes(model.trained_model_object)
+        feature_encoder = getattr(model, "feature_encoder", None)
+        if size is not None and feature_encoder is not None:
+            size += sum(block.table.nbytes for block in feature_encoder.blocks)
+        return size
+    if hasattr(model, "segment_models"):
+        sizes = [get_model_nbytes(segment_model) for segment_model in model.models]
+        return None if None in sizes else sum(sizes)
+    if hasattr(model, "get_booster"):
+        return len(model.get_booster().save_raw()) * XGBOOST_MEMORY_FACTOR
+    if hasattr(model, "estimators_") and hasattr(model.estimators_[0], "tree_"):
+        return sum(get_model_nbytes(estimator) for estimator in model.estimators_)
+    if hasattr(model, "tree_"):
+        state = model.tree_.__getstate__()
+        return state["nodes"].nbytes + state["values"].nbytes
+    return None
+
+
+class ModelRegistry:
+    def __init__(
+        self,
+        model_name: str = None,
+        bucket_name: str = BUCKET_NAME,
+        memory_budget_mb: float = MODEL_REGISTRY_MEMORY_BUDGET_MB,
+        s3: S3Operation = None,
+        artifact_format: str = MODEL_ARTIFACT_FORMAT,
+        missing_ttl: float = MODEL_REGISTRY_MISSING_TTL_SECONDS,
+    ):
+        if artifact_format not in (PICKLE_ARTIFACT, MAPPED_ARTIFACT):
+            raise ValueError(
+                f"Unknown model artifact format {artifact_format!r}, expected 'pickle' or 'mapped'"
+            )
+        if model_name is None:
+            model_name = S3_MAPPED_MODEL_MANIFEST_KEY if artifact_format == MAPPED_ARTIFACT else MODEL_FILE_NAME
+
+        self.artifact_format = artifact_format
+        self.model_name = model_name
+        self.bucket_name = bucket_name
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024)
+        self.missing_ttl = missing_ttl
+        self._s3 = s3
+
+        # ETag -> (model, estimated bytes), least recently used first
+        self._models: "OrderedDict[str, Tuple[object, int]]" = OrderedDict()
+        # VersionId or ETag a request pinned -> ETag of the resident model
+        self._aliases: Dict[str, str] = {}
+        # Version found missing -> monotonic time until which it is answered as missing, oldest first
+        self._missing: "OrderedDict[str, float]" = OrderedDict()
+        self._resident_bytes = 0
+        self._lock = threading.Lock()
+        # Loads are serialized, so concurrent requests for a new version download it once
+        self._load_lock = threading.Lock()
+
+    @property
+    def s3(self) -> S3Operation:
+        if self._s3 is None:
+            self._s3 = S3Operation()
+        return self._s3
+
+    def _get_resident(self, version: str) -> Optional[object]:
+        with self._lock:
+            etag = self._aliases.get(version, version)
+            entry = self._models.get(etag)
+            if entry is None:
+                return None
+            self._models.move_to_end(etag)
+            return entry[0]
+
+    def get_model(self, version: str) -> object:
+
+        """
+        Method Name :   get_model
+
+        Description :   This method returns the model of the pinned version, an S3 VersionId or ETag of the
+                        model object, loading it on first use. Loaded versions stay resident until the
+                        least recently used ones are evicted to keep within the memory budget. The version
+                        is looked up in the bucket before the load lock is taken, and a version found
+                        missing is rejected without listing the bucket again for missing_ttl seconds.
+
+        Output      :   Model object
+        """
+        model = self._get_resident(version)
+        if model is not None:
+            REGISTRY_EVENTS.inc(event="hit")
+            return model
+
+        # Listing the versions does not hold up the loads of other versions
+        object_version = self._resolve(version)
+
+        with self._load_lock:
+            model = self._get_resident(version)
+            if model is not None:
+                REGISTRY_EVENTS.inc(event="hit")
+                return model
+            return self._load(version, object_version)
+
+    def _resolve(self, version: str) -> Dict:
+        if self._is_missing(version):
+            REGISTRY_EVENTS.inc(event="missing")
+            raise self._get_not_found_exception(version)
+
+        try:
+            versions = self.s3.get_object_versions(self.model_name, self.bucket_name)
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+        for object_version in versions:
+            if version in (object_version["VersionId"], object_version["ETag"]):
+                return object_version
+
+        self._set_missing(version)
+        REGISTRY_EVENTS.inc(event="missing")
+        raise self._get_not_found_exception(version)
+
+    def _is_missing(self, version: str) -> bool:
+        with self._lock:
+            expires_at = self._missing.get(version)
+            if expires_at is None:
+                return False
+            if time.monotonic() < expires_at:
+                return True
+            del self._missing[version]
+            return False
+
+    def _set_missing(self, version: str) -> None:
+        if self.missing_ttl <= 0:
+            return
+        with self._lock:
+            self._missing.pop(version, None)
+            self._missing[version] = time.monotonic() + self.missing_ttl
+            while len(self._missing) > MISSING_VERSIONS_MAX_ENTRIES:
+                self._missing.popitem(last=False)
+
+    def _get_not_found_exception(self, version: str) -> ModelVersionNotFoundException:
+        return ModelVersionNotFoundException(
+            f"Model version {version} of {self.model_name} is not present in {self.bucket_name} bucket"
+        )
+
+    def _load(self, version: str, object_version: Dict) -> object:
+        try:
+            started_at = time.perf_counter()
+            # A bucket without versioning reports "null", which get_object does not accept
+            version_id = None if object_version["VersionId"] == "null" else object_version["VersionId"]
+
+            if self.artifact_format == MAPPED_ARTIFACT:
+                model_dir, etag = download_mapped_model(
+                    self.s3, self.model_name, self.bucket_name, MAPPED_MODEL_CACHE_DIR, version_id
+                )
+                model = MappedCostModel.load(model_dir)
+                # The manifest is tiny, the memory is in the arrays it maps
+                arrays, _ = model.get_arrays()
+                size = sum(array.nbytes for array in arrays.values())
+            else:
+                model, etag = self.s3.load_model_with_etag(
+                    self.model_name, self.bucket_name, version_id=version_id
+                )
+                # Measured on the loaded trees, the pickled size stays a floor and covers unknown model types
+                size = max(get_model_nbytes(model) or 0, object_version["Size"])
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+        with self._lock:
+            self._models[etag] = (model, size)
+            self._aliases[version] = self._aliases[object_version["VersionId"]] = etag
+            self._resident_bytes += size
+            evicted = self._evict(keep=etag)
+            REGISTRY_MODELS.set(len(self._models))
+            REGISTRY_BYTES.set(self._resident_bytes)
+
+        REGISTRY_EVENTS.inc(event="load")
+        logger.info(
+            f"Loaded model version {etag} of {self.model_name}",
+            extra={
+                "model_version": etag,
+                "version_id": object_version["VersionId"],
+                "model_bytes": size,
+                "load_seconds": time.perf_counter() - started_at,
+                "resident_models": len(self._models),
+                "resident_bytes": self._resident_bytes,
+            },
+        )
+        for evicted_etag, evicted_size in evicted:
+            REGISTRY_EVENTS.inc(event="evict")
+            logger.info(
+                f"Evicted model version {evicted_etag} of {self.model_name}",
+                extra={"model_version": evicted_etag, "model_bytes": evicted_size},
+            )
+        if size > self.memory_budget_bytes:
+            logger.warning(
+                f"Model version {etag} needs {size} bytes, more than the budget of {self.memory_budget_bytes}"
+            )
+        return model
+
+    def _evict(self, keep: str) -> List[Tuple[str, int]]:
+        # Called with _lock held. The version just loaded is kept even if it alone exceeds the budget.
+        evicted = []
+        while self._resident_bytes > self.memory_budget_bytes and len(self._models) > 1:
+            etag, (_, size) = next(iter(self._models.items()))
+            if etag == keep:
+                self._models.move_to_end(etag)
+                continue
+            del self._models[etag]
+            self._resident_bytes -= size
+            self._aliases = {alias: target for alias, target in self._aliases.items() if target != etag}
+            evicted.append((etag, size))
+        return evicted
+
+    def get_resident_versions(self) -> List[Dict]:
+        """Returns the resident versions with their estimated size, most recently used last."""
+        with self._lock:
+            return [{"version": etag, "bytes": size} for etag, (_, size) in self._models.items()]
@@ -1,8 +1,10 @@
+import itertools
 import os
-from shipment.logger import logging
+from shipment.logger import get_logger
 import sys
+import numpy as np
 import pandas as pd
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 from pandas import DataFrame
 from shipment.constant import MODEL_CONFIG_FILE
 from shipment.entity.config_entity import ModelTrainerConfig
@@ -10,14 +12,34 @@ from shipment.entity.artifact_entity import (
     DataTransformationArtifacts,
     ModelTrainerArtifacts,
 )
+from shipment.components.feature_encoder import FeatureEncoder
+from shipment.components.mapped_model import MappedCostModel
+from shipment.components.segmented_model import SegmentedModel
+from shipment.components.tree_explainer import Explanation, get_tree_contributions
 from shipment.exception import ShippingException
+from shipment.utils.metrics import time_stage
+
+logger = get_logger(__name__)
 
 
 
 class CostModel:
-    def __init__(self, preprocessing_object: object, trained_model_object: object):
+    def __init__(
+        self,
+        preprocessing_object: object,
+        trained_model_object: object,
+        feature_encoder: object = None,
+    ):
         self.preprocessing_object = preprocessing_object
         self.trained_model_object = trained_model_object
+        self.feature_encoder = feature_encoder
+
+    def transform(self, X: DataFrame):
+        # Models pickled before the feature encoder existed have no such attribute
+        feature_encoder = getattr(self, "feature_encoder", None)
+        if feature_encoder is not None:
+            return feature_encoder.transform_frame(X)
+        return self.preprocessing_object.transform(X)
 
     def predict(self, X) -> float:
 
@@ -28,17 +50,147 @@ class CostModel:
         
         Output      :   Predictions 
         """
-        logging.info("Entered predict method the class")
+        logger.info("Entered predict method the class")
         try:
             # Using the trained model to get predictions
-            transformed_feature = self.preprocessing_object.transform(X)
-            logging.info("Used the trained model to get predictions")
+            with time_stage("preprocess"):
+                transformed_feature = self.transform(X)
+            logger.info("Used the trained model to get predictions")
 
-            return self.trained_model_object.predict(transformed_feature)
+            with time_stage("predict"):
+                return self.trained_model_object.predict(transformed_feature)
 
         except Exception as e:
             raise ShippingException(e, sys) from e
 
+    def predict_records(self, records: List[Dict]) -> float:
+
+        """
+        Method Name :   predict_records
+
+        Description :   This method predicts records keyed by input column. With a feature encoder the records
+                        are written straight into a numpy buffer, without building a dataframe.
+
+        Output      :   Predictions
+        """
+        try:
+            feature_encoder = getattr(self, "feature_encoder", None)
+            if feature_encoder is None:
+                with time_stage("dataframe_build"):
+                    X = pd.DataFrame.from_records(records)
+                return self.predict(X)
+
+            with time_stage("preprocess"):
+                transformed_feature = feature_encoder.transform_records(records)
+
+            with time_stage("predict"):
+                return self.trained_model_object.predict(transformed_feature)
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+    def predict_encoded(
+        self,
+        categorical: Dict[str, Tuple[np.ndarray, np.ndarray]],
+        numeric: Dict[str, np.ndarray],
+        n_rows: int,
+    ) -> np.ndarray:
+
+        """
+        Method Name :   predict_encoded
+
+        Description :   This method predicts dictionary-encoded columns through the feature encoder. Models
+                        without a feature encoder rebuild the input dataframe instead.
+
+        Output      :   Predictions
+        """
+        try:
+            feature_encoder = getattr(self, "feature_encoder", None)
+            if feature_encoder is None:
+                with time_stage("dataframe_build"):
+                    # Code -1 picks the None appended after the categories
+                    X = pd.DataFrame(
+                        {
+                            column: np.append(np.asarray(categories, dtype=object), None)[codes]
+                            for column, (codes, categories) in categorical.items()
+                        }
+                    )
+                    for column, values in numeric.items():
+                        X[column] = values
+                return self.predict(X)
+
+            with time_stage("preprocess"):
+                transformed_feature = feature_encoder.transform_encoded(categorical, numeric, n_rows)
+
+            with time_stage("predict"):
+                return self.trained_model_object.predict(transformed_feature)
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+    def explain(self, X: DataFrame) -> Explanation:
+
+        """
+        Method Name :   explain
+
+        Description :   This method splits each prediction into a base value and the contribution of each input
+                        column, from the trained model's batched contributions folded back through the
+                        encoder layout.
+
+        Output      :   Explanation
+        """
+        try:
+            with time_stage("preprocess"):
+                transformed_feature = self.transform(X)
+            return self._explain_transformed(transformed_feature)
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+    def explain_records(self, records: List[Dict]) -> Explanation:
+
+        """
+        Method Name :   explain_records
+
+        Description :   This method explains the predictions of records keyed by input column.
+
+        Output      :   Explanation
+        """
+        try:
+            feature_encoder = getattr(self, "feature_encoder", None)
+            if feature_encoder is None:
+                with time_stage("dataframe_build"):
+                    X = pd.DataFrame.from_records(records)
+                return self.explain(X)
+
+            with time_stage("preprocess"):
+                transformed_feature = feature_encoder.transform_records(records)
+            return self._explain_transformed(transformed_feature)
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+    def _explain_transformed(self, transformed_feature) -> Explanation:
+        feature_encoder = getattr(self, "feature_encoder", None) or getattr(self, "_layout_encoder", None)
+        if feature_encoder is None:
+            # Only the column layout is needed, which the preprocessor compiles to even if it was never saved.
+            # It is kept apart from feature_encoder, so predictions still go through the saved preprocessor.
+            feature_encoder = self._layout_encoder = FeatureEncoder.from_preprocessor(self.preprocessing_object)
+        if hasattr(transformed_feature, "toarray"):
+            transformed_feature = transformed_feature.toarray()
+
+        with time_stage("predict"):
+            predictions = self.trained_model_object.predict(transformed_feature)
+
+        with time_stage("explain"):
+            base_values, contributions = get_tree_contributions(self.trained_model_object, transformed_feature)
+            return Explanation(
+                base_values,
+                feature_encoder.fold_contributions(contributions),
+                feature_encoder.input_columns,
+                predictions,
+            )
+
     def __repr__(self):
         return f"{type(self.trained_model_object).__name__}()"
 
@@ -67,14 +219,14 @@ class ModelTrainer:
         
         Output      :   List of trained models 
         """
-        logging.info("Entered get_trained_models method of ModelTrainer class")
+        logger.info("Entered get_trained_models method of ModelTrainer class")
         try:
             # Getting the model lists from model config file
             model_config = self.model_trainer_config.UTILS.read_yaml_file(
                 filename=MODEL_CONFIG_FILE
             )
             models_list = list(model_config["train_model"].keys())
-            logging.info("Got model list from the config file")
+            logger.info("Got model list from the config file")
 
             # Splitting the data in x_train, y_train, x_test and y_test
             x_train, y_train, x_test, y_test = (
@@ -93,14 +245,108 @@ class ModelTrainer:
                 )
                 for model_name in models_list
             ]
-            logging.info("Got trained model list")
-            logging.info("Exited the get_trained_models method of ModelFinder class")
+            logger.info("Got trained model list")
+            logger.info("Exited the get_trained_models method of ModelFinder class")
 
             return tuned_model_list
 
         except Exception as e:
             raise ShippingException(e, sys) from e
 
+    # This method is used to fit one compact model per segment of the data
+    def get_segmented_model(
+        self,
+        best_model: object,
+        best_model_score: float,
+        feature_encoder: FeatureEncoder,
+        train_df: DataFrame,
+        test_df: DataFrame,
+        segment_config: Dict,
+    ) -> Tuple[object, float]:
+
+        """
+        Method Name :   get_segmented_model
+
+        Description :   This method fits a clone of the best model, with the compact parameters of the segment
+                        config, on the rows of each segment big enough. The segmented model replaces the best
+                        model if its test score is no more than max_score_loss below it.
+
+        Output      :   Tuple of the model to use and its score
+        """
+        logger.info("Entered get_segmented_model method of ModelTrainer class")
+        try:
+            from sklearn.base import clone
+
+            x_train, y_train = train_df.iloc[:, :-1], train_df.iloc[:, -1]
+            x_test, y_test = test_df.iloc[:, :-1], test_df.iloc[:, -1]
+            segment_columns = segment_config["segment_columns"]
+            segment_slices, segment_categories = SegmentedModel.get_segment_layout(
+                feature_encoder, segment_columns
+            )
+            model_params = segment_config.get("model_params", {}).get(type(best_model).__name__, {})
+
+            # Segments are read from the encoded training rows, the way the segmented model reads them
+            layout = SegmentedModel(best_model, segment_columns, segment_slices, segment_categories, {})
+            train_codes = layout.get_segment_codes(x_train.to_numpy())
+
+            segment_models = {}
+            for segment in itertools.product(*segment_categories):
+                rows = np.flatnonzero(train_codes == layout.get_segment_code(segment))
+                if len(rows) < segment_config["min_segment_rows"]:
+                    logger.info(f"Segment {segment} has {len(rows)} training rows, using the global model")
+                    continue
+
+                segment_model = clone(best_model).set_params(**model_params)
+                segment_model.fit(x_train.iloc[rows], y_train.iloc[rows])
+                segment_models[segment] = segment_model
+                logger.info(f"Fitted a {type(segment_model).__name__} on the {len(rows)} rows of segment {segment}")
+
+            segmented_model = SegmentedModel(
+                best_model, segment_columns, segment_slices, segment_categories, segment_models
+            )
+            segmented_score = self.model_trainer_config.UTILS.get_model_score(
+                y_test, segmented_model.predict(x_test.to_numpy())
+            )
+            logger.info(f"Segmented model score is {segmented_score}, global model score is {best_model_score}")
+
+            logger.info("Exited get_segmented_model method of ModelTrainer class")
+            if segment_models and segmented_score >= best_model_score - segment_config["max_score_loss"]:
+                return segmented_model, segmented_score
+            return best_model, best_model_score
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+    # This method is used to export the model in the memory-mappable format
+    def export_mapped_model(self, cost_model: CostModel, x_test: DataFrame) -> Optional[str]:
+
+        """
+        Method Name :   export_mapped_model
+
+        Description :   This method converts the cost model to the mapped model format and saves it if its
+                        predictions match the trained model on the transformed test data.
+
+        Output      :   Mapped model directory, or None if the model could not be exported
+        """
+        logger.info("Entered export_mapped_model method of ModelTrainer class")
+        try:
+            mapped_model = MappedCostModel.from_cost_model(cost_model)
+        except ValueError as e:
+            logger.info(f"Skipped exporting the mapped model: {e}")
+            return None
+
+        try:
+            if not mapped_model.tree_ensemble.matches_model(cost_model.trained_model_object, x_test):
+                logger.info("Mapped model does not reproduce the trained model, not exporting it")
+                return None
+
+            mapped_model.save(self.model_trainer_config.MAPPED_MODEL_DIR)
+            logger.info("Exited export_mapped_model method of ModelTrainer class")
+            return self.model_trainer_config.MAPPED_MODEL_DIR
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
     # This method is used to initialize model training
     def initiate_model_trainer(self) -> ModelTrainerArtifacts:
 
@@ -111,13 +357,13 @@ class ModelTrainer:
         
         Output      :   List of trained models 
         """
-        logging.info("Entered initiate_model_trainer nethod of ModelTrainer class")
+        logger.info("Entered initiate_model_trainer nethod of ModelTrainer class")
         try:
             # Creating Model trainer artifacts directory
             os.makedirs(
                 self.model_trainer_config.MODEL_TRAINER_ARTIFACTS_DIR, exist_ok=True
             )
-            #logging.info(
+            #logger.info(
             #    f"Created artifacts directory for {os.path.basename(self.model_trainer_config.DATA_TRANSFORMATION_ARTIFACTS_DIR)}"
             #)
 
@@ -126,7 +372,7 @@ class ModelTrainer:
                 self.data_transformation_artifact.transformed_train_file_path
             )
             train_df = pd.DataFrame(train_array)
-            logging.info(
+            logger.info(
                 f"Loaded train array from DataTransformationArtifacts directory and converted into Dataframe."
             )
 
@@ -135,20 +381,20 @@ class ModelTrainer:
                 self.data_transformation_artifact.transformed_test_file_path
             )
             test_df = pd.DataFrame(test_array)
-            logging.info(
+            logger.info(
                 f"Loaded test array from DataTransformationArtifacts directory and converted into Dataframe."
             )
 
             # getting the models list and finding the best model with score
             list_of_trained_models = self.get_trained_models(train_df, test_df)
-            logging.info("Got a list of tuple of model score,model and model name")
+            logger.info("Got a list of tuple of model score,model and model name")
             (
                 best_model,
                 best_model_score,
             ) = self.model_trainer_config.UTILS.get_best_model_with_name_and_score(
                 list_of_trained_models
             )
-            logging.info("Got best model score,model and model name")
+            logger.info("Got best model score,model and model name")
 
             # Loading the preoprocessor object
             preprocessor_obj_file_path = (
@@ -157,7 +403,15 @@ class ModelTrainer:
             preprocessing_obj = self.model_trainer_config.UTILS.load_object(
                 preprocessor_obj_file_path
             )
-            logging.info("Loaded preprocessing object")
+            logger.info("Loaded preprocessing object")
+
+            # Loading the feature encoder compiled from the preprocessor, if it was exported
+            feature_encoder = None
+            if self.data_transformation_artifact.feature_encoder_file_path is not None:
+                feature_encoder = self.model_trainer_config.UTILS.load_object(
+                    self.data_transformation_artifact.feature_encoder_file_path
+                )
+                logger.info("Loaded feature encoder object")
 
             # Reading model config file for getting the best model score
             model_config = self.model_trainer_config.UTILS.read_yaml_file(
@@ -165,31 +419,49 @@ class ModelTrainer:
             )
             base_model_score = float(model_config["base_model_score"])
 
+            # Routing rows to per-segment models, when enabled and no less accurate than the global model
+            segment_config = model_config.get("segment_model", {})
+            if segment_config.get("enabled", False):
+                best_model, best_model_score = self.get_segmented_model(
+                    best_model,
+                    best_model_score,
+                    feature_encoder or FeatureEncoder.from_preprocessor(preprocessing_obj),
+                    train_df,
+                    test_df,
+                    segment_config,
+                )
+
+            mapped_model_dir = None
+
             # Updating the model score to model config file if the the model score is greater than the base model score
             if best_model_score >= base_model_score:
                 # self.model_trainer_config.UTILS.update_model_score(best_model_score)
                 # logger.info("Updating model score in yaml file")
 
                 # Loading cost model object with preprocessor and model
-                cost_model = CostModel(preprocessing_obj, best_model)
-                logging.info(
+                cost_model = CostModel(preprocessing_obj, best_model, feature_encoder)
+                logger.info(
                     "Created cost model object with preprocessor and model"
                 )
                 trained_model_path = self.model_trainer_config.TRAINED_MODEL_FILE_PATH
-                logging.info("Created best model file path")
+                logger.info("Created best model file path")
 
                 # saving cost model in model artifacts directory
                 model_file_path = self.model_trainer_config.UTILS.save_object(
                     trained_model_path, cost_model
                 )
-                logging.info("Saved the best model object path")
+                logger.info("Saved the best model object path")
+
+                # Exporting the memory-mappable copy of the model when it reproduces the trained model
+                mapped_model_dir = self.export_mapped_model(cost_model, x_test=test_df.iloc[:, :-1])
             else:
-                logging.info("No best model found with score more than base score")
+                logger.info("No best model found with score more than base score")
                 #raise "No best model found with score more than base score "
 
             # saving the Model trainer artifacts
             model_trainer_artifacts = ModelTrainerArtifacts(
-                trained_model_file_path=model_file_path
+                trained_model_file_path=model_file_path,
+                mapped_model_dir=mapped_model_dir,
             )
 
             return model_trainer_artifacts
@@ -0,0 +1,63 @@
+import asyncio
+from typing import Optional
+from shipment.constant import *
+from shipment.components.inference_pool import PROCESS_POOL, InferencePool
+from shipment.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class ModelWarmup:
+    def __init__(
+        self, inference_pool: InferencePool, retry_seconds: float = WARMUP_RETRY_SECONDS
+    ):
+        self.inference_pool = inference_pool
+        self.retry_seconds = retry_seconds
+        self.ready = False
+        self.model_version: Optional[str] = None
+        self.error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self) -> None:
+
+        """
+        Method Name :   run
+
+        Description :   This method warms up the model on the inference pool, retrying every retry_seconds
+                        until it succeeds. With a process pool one warmup job is sent per worker, so every
+                        worker loads its own copy before the service reports ready.
+
+        Output      :   None
+        """
+        jobs = (
+            self.inference_pool.max_workers
+            if self.inference_pool.kind == PROCESS_POOL
+            else 1
+        )
+        while not self.ready:
+            try:
+                versions = await asyncio.gather(
+                    *[self.inference_pool.run("warmup") for _ in range(jobs)]
+                )
+                self.model_version = versions[0]
+                self.error = None
+                self.ready = True
+                logger.info(f"Prediction service is ready with model version {self.model_version}")
+
+            except Exception as e:
+                self.error = f"{e}"
+                logger.error(f"Model warmup failed, retrying in {self.retry_seconds} seconds: {e}")
+                await asyncio.sleep(self.retry_seconds)
@@ -0,0 +1,164 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from shipment.constant import *
+from shipment.components.model_predictor import shippingData
+from shipment.logger import get_logger
+from shipment.utils.main_utils import MainUtils
+from shipment.utils.metrics import REGISTRY
+
+logger = get_logger(__name__)
+
+
+CACHE_REQUESTS = REGISTRY.counter(
+    "shipment_prediction_cache_requests_total",
+    "Prediction cache lookups by result: hit, miss or coalesced into an in-flight computation",
+    ["result"],
+)
+CACHE_HIT_RATIO = REGISTRY.gauge(
+    "shipment_prediction_cache_hit_ratio",
+    "Share of prediction cache lookups served without a new computation",
+)
+CACHE_SIZE = REGISTRY.gauge(
+    "shipment_prediction_cache_entries",
+    "Number of predictions currently held in the cache",
+)
+
+
+class PredictionCache:
+    def __init__(
+        self,
+        max_size: int = PREDICTION_CACHE_MAX_SIZE,
+        ttl: float = PREDICTION_CACHE_TTL_SECONDS,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.columns = list(shippingData.FIELD_COLUMNS.values())
+        self.numerical_columns = set(
+            MainUtils().read_yaml_file(filename=SCHEMA_FILE_PATH)["numerical_columns"]
+        )
+
+        self._entries: "OrderedDict[Tuple, Tuple[float, float]]" = OrderedDict()
+        self._inflight: Dict[Tuple, asyncio.Task] = {}
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        self._hits = self._lookups = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+
+    def make_key(self, record: Dict) -> Tuple:
+
+        """
+        Method Name :   make_key
+
+        Description :   This method builds the canonical cache key of a record. Numerical features are
+                        normalized to float so "17" and "17.0" share an entry; categorical values are kept
+                        as they are, since the model treats any other spelling as a different category.
+
+        Output      :   Tuple of the 14 input features
+        """
+        key = []
+        for column in self.columns:
+            value = record.get(column)
+            if column in self.numerical_columns:
+                try:
+                    value = float(value)
+                except (TypeError, ValueError):
+                    pass
+            key.append(value)
+        return tuple(key)
+
+    def _record_lookup(self, result: str) -> None:
+        CACHE_REQUESTS.inc(result=result)
+        self._lookups += 1
+        if result != "miss":
+            self._hits += 1
+        CACHE_HIT_RATIO.set(self._hits / self._lookups)
+
+    def _get(self, key: Tuple) -> Optional[float]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _put(self, key: Tuple, value: float) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            CACHE_SIZE.set(len(self._entries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            CACHE_SIZE.set(0)
+
+    async def get_or_compute(
+        self,
+        record: Dict,
+        version: Optional[str],
+        compute: Callable[[], Awaitable[float]],
+    ) -> float:
+
+        """
+        Method Name :   get_or_compute
+
+        Description :   This method returns the cached prediction of the record for the given model version,
+                        or computes it. Identical concurrent requests share a single computation, which runs
+                        as its own task, so a cancelled request does not cancel the requests that joined it.
+                        The cache is emptied whenever the model version changes.
+
+        Output      :   Predicted cost
+        """
+        if not self.enabled or version is None:
+            return await compute()
+
+        if version != self._version:
+            if self._version is not None:
+                logger.info(f"Model version changed from {self._version} to {version}, clearing prediction cache")
+            self.clear()
+            self._inflight.clear()
+            self._version = version
+
+        key = self.make_key(record)
+        value = self._get(key)
+        if value is not None:
+            self._record_lookup("hit")
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self._record_lookup("coalesced")
+            return await asyncio.shield(inflight)
+
+        self._record_lookup("miss")
+        task = asyncio.create_task(self._compute(key, version, compute))
+        self._inflight[key] = task
+        task.add_done_callback(lambda task: self._finish(key, task))
+        return await asyncio.shield(task)
+
+    async def _compute(
+        self, key: Tuple, version: str, compute: Callable[[], Awaitable[float]]
+    ) -> float:
+        value = await compute()
+        if self._version == version:
+            self._put(key, value)
+        return value
+
+    def _finish(self, key: Tuple, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Marking the exception as retrieved when every request that waited for it was cancelled
+            task.exception()
@@ -0,0 +1,238 @@
+import json
+import math
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from shipment.constant import *
+from shipment.components.model_predictor import shippingData
+from shipment.logger import get_logger
+from shipment.utils.main_utils import MainUtils
+
+logger = get_logger(__name__)
+
+
+try:
+    import orjson
+
+    def loads_json(content: bytes):
+        return orjson.loads(content)
+
+    def dumps_json(content) -> bytes:
+        return orjson.dumps(content)
+
+except ImportError:
+
+    def loads_json(content: bytes):
+        return json.loads(content)
+
+    def dumps_json(content) -> bytes:
+        return json.dumps(content, separators=(",", ":")).encode()
+
+
+class ShipmentValidationError(ValueError):
+    """Raised with the errors of every invalid field, in the shape of FastAPI's 422 response detail."""
+
+    def __init__(self, errors: List[Dict]):
+        super().__init__(f"{len(errors)} invalid fields")
+        self.errors = errors
+
+
+def _compile_numeric(low: Optional[float], high: Optional[float]) -> Callable:
+    low = -math.inf if low is None else float(low)
+    high = math.inf if high is None else float(high)
+
+    def check(value) -> float:
+        if value is None:
+            raise ValueError("may not be null")
+        # bool is an int subclass, but true is not a valid weight
+        if type(value) not in (int, float):
+            raise ValueError(f"must be a number, got {type(value).__name__}")
+        value = float(value)
+        if not low <= value <= high:
+            raise ValueError(f"must be between {low:g} and {high:g}, got {value:g}")
+        return value
+
+    return check
+
+
+def _compile_categorical(categories: List[str], nullable: bool) -> Callable:
+    allowed = frozenset(categories)
+    expected = ", ".join(sorted(categories))
+
+    def check(value) -> object:
+        if value is None:
+            if not nullable:
+                raise ValueError("may not be null")
+            return math.nan
+        if type(value) is not str or value not in allowed:
+            raise ValueError(f"must be one of {expected}, got {value!r}")
+        return value
+
+    return check
+
+
+class ShipmentValidator:
+    def __init__(self, checks: List[Tuple[str, str, Callable]], json_schema: Dict):
+        # (request field, input column, check) triples, compiled once per model version
+        self.checks = checks
+        self.fields = frozenset(field for field, _, _ in checks)
+        self.json_schema = json_schema
+        self.numeric_fields = frozenset(
+            field for field, schema in json_schema["properties"].items() if schema.get("type") == "number"
+        )
+
+    @classmethod
+    def from_schema(
+        cls,
+        categorical_domains: Dict[str, Dict],
+        schema_file_path: str = SCHEMA_FILE_PATH,
+    ) -> "ShipmentValidator":
+
+        """
+        Method Name :   from_schema
+
+        Description :   This method compiles a check per request field. Numerical fields get the ranges of the
+                        schema file and categorical fields the categories the model's encoder was fitted
+                        with, as returned by CostPredictor.get_categorical_domains.
+
+        Output      :   ShipmentValidator
+        """
+        schema_config = MainUtils().read_yaml_file(filename=schema_file_path)
+        numerical_columns = set(schema_config["numerical_columns"])
+        numerical_ranges = schema_config.get("numerical_ranges", {})
+
+        checks, properties = [], {}
+        for field, column in shippingData.FIELD_COLUMNS.items():
+            if column in numerical_columns:
+                bounds = numerical_ranges.get(column, {})
+                checks.append((field, column, _compile_numeric(bounds.get("min"), bounds.get("max"))))
+                properties[field] = {"type": "number", "title": column}
+                if bounds.get("min") is not None:
+                    properties[field]["minimum"] = bounds["min"]
+                if bounds.get("max") is not None:
+                    properties[field]["maximum"] = bounds["max"]
+            else:
+                domain = categorical_domains.get(column)
+                if domain is None:
+                    raise ValueError(f"Model has no categories for input column {column!r}")
+                checks.append(
+                    (field, column, _compile_categorical(domain["categories"], domain["nullable"]))
+                )
+                properties[field] = {
+                    "enum": list(domain["categories"]) + ([None] if domain["nullable"] else []),
+                    "title": column,
+                }
+
+        json_schema = {
+            "$schema": "https://json-schema.org/draft/2020-12/schema",
+            "title": "Shipment",
+            "type": "object",
+            "properties": properties,
+            "required": list(properties),
+            "additionalProperties": False,
+        }
+        return cls(checks, json_schema)
+
+    def validate(self, shipment, location: Tuple = ("body",)) -> Dict:
+
+        """
+        Method Name :   validate
+
+        Description :   This method checks a shipment keyed by request field and coerces it into a record keyed
+                        by input column, with floats for numerical and category strings for categorical
+                        columns. Every invalid field is reported, not just the first.
+
+        Output      :   Record keyed by input column
+        """
+        if not isinstance(shipment, dict):
+            raise ShipmentValidationError(
+                [{"loc": list(location), "msg": "must be an object", "type": "type_error"}]
+            )
+
+        record, errors = {}, []
+        for field, column, check in self.checks:
+            if field not in shipment:
+                errors.append({"loc": [*location, field], "msg": "field required", "type": "missing"})
+                continue
+            try:
+                record[column] = check(shipment[field])
+            except ValueError as e:
+                errors.append({"loc": [*location, field], "msg": str(e), "type": "value_error"})
+
+        for field in shipment.keys() - self.fields:
+            errors.append({"loc": [*location, field], "msg": "unexpected field", "type": "extra_forbidden"})
+
+        if errors:
+            raise ShipmentValidationError(errors)
+        return record
+
+    def validate_form(self, form: Dict[str, Optional[str]]) -> Dict:
+
+        """
+        Method Name :   validate_form
+
+        Description :   This method validates the string fields of the HTML form, keyed by request field.
+                        Numerical fields are parsed as floats first, an empty field counts as missing.
+
+        Output      :   Record keyed by input column
+        """
+        shipment, errors = {}, []
+        for field, value in form.items():
+            if field in self.numeric_fields and isinstance(value, str):
+                value = value.strip()
+                try:
+                    value = float(value) if value else None
+                except ValueError:
+                    errors.append({"loc": ["form", field], "msg": "must be a number", "type": "value_error"})
+                    continue
+            shipment[field] = value
+
+        try:
+            record = self.validate(shipment, location=("form",))
+        except ShipmentValidationError as e:
+            errors.extend(e.errors)
+        if errors:
+            raise ShipmentValidationError(errors)
+        return record
+
+    def validate_many(self, shipments: List) -> List[Dict]:
+        """Validates each shipment of a batch, reporting the errors of all of them together."""
+        records, errors = [], []
+        for index, shipment in enumerate(shipments):
+            try:
+                records.append(self.validate(shipment, location=("body", index)))
+            except ShipmentValidationError as e:
+                errors.extend(e.errors)
+        if errors:
+            raise ShipmentValidationError(errors)
+        return records
+
+
+class ShipmentValidatorCache:
+    def __init__(self, load_domains: Callable[[Optional[str]], Awaitable[Dict]], max_size: int = 8):
+        # load_domains(pinned_version) returns CostPredictor.get_categorical_domains of that version
+        self.load_domains = load_domains
+        self.max_size = max_size
+        self._validators: "OrderedDict[Tuple, ShipmentValidator]" = OrderedDict()
+
+    async def get(self, model_version: Optional[str], pinned_version: Optional[str] = None) -> ShipmentValidator:
+
+        """
+        Method Name :   get
+
+        Description :   This method returns the validator compiled for model_version, compiling it from the
+                        categories of that model on first use. The few most recent versions are kept.
+
+        Output      :   ShipmentValidator
+        """
+        key = (model_version, pinned_version is not None)
+        validator = self._validators.get(key)
+        if validator is None:
+            domains = await self.load_domains(pinned_version)
+            validator = ShipmentValidator.from_schema(domains)
+            logger.info(f"Compiled request validator for model version {model_version}")
+            self._validators[key] = validator
+            while len(self._validators) > self.max_size:
+                self._validators.popitem(last=False)
+        else:
+            self._validators.move_to_end(key)
+        return validator
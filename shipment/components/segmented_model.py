@@ -0,0 +1,111 @@
+from typing import Dict, List, Tuple
+import numpy as np
+from shipment.components.feature_encoder import FeatureEncoder
+
+
+class SegmentedModel:
+    def __init__(
+        self,
+        global_model: object,
+        segment_columns: List[str],
+        segment_slices: List[Tuple[int, int]],
+        segment_categories: List[List],
+        segment_models: Dict[Tuple, object],
+    ):
+        # Scores the rows of segments without a model of their own, and rows with an unseen category
+        self.global_model = global_model
+        self.segment_columns = segment_columns
+        # (offset, width) of each segment column's one-hot block in the encoded features
+        self.segment_slices = segment_slices
+        self.segment_categories = segment_categories
+        # Tuple of one category per segment column -> model fitted on that segment's rows
+        self.segment_models = segment_models
+
+        # Segment codes index this table of positions in models, the last code is for rows outside every segment
+        self._strides = np.cumprod([1] + [len(categories) for categories in segment_categories[:-1]])
+        n_codes = int(np.prod([len(categories) for categories in segment_categories]))
+        self.models = [global_model] + list(segment_models.values())
+        self._model_indices = np.zeros(n_codes + 1, dtype=np.intp)
+        for model_index, segment in enumerate(segment_models, start=1):
+            self._model_indices[self.get_segment_code(segment)] = model_index
+
+    @staticmethod
+    def get_segment_layout(
+        feature_encoder: FeatureEncoder, segment_columns: List[str]
+    ) -> Tuple[List[Tuple[int, int]], List[List]]:
+
+        """
+        Method Name :   get_segment_layout
+
+        Description :   This method finds the one-hot block of each segment column in the encoded features,
+                        so segments are read straight from the model input. Columns that are not one-hot
+                        encoded raise ValueError.
+
+        Output      :   (offset, width) and categories of each segment column
+        """
+        # A column can be encoded more than once, International is both one-hot and binary encoded
+        one_hot_blocks = {}
+        for block in feature_encoder.blocks:
+            if np.array_equal(block.table[: len(block.categories)], np.eye(block.width)):
+                one_hot_blocks.setdefault(block.column, block)
+
+        segment_slices, segment_categories = [], []
+        for column in segment_columns:
+            block = one_hot_blocks.get(column)
+            if block is None:
+                raise ValueError(f"Segment column {column!r} is not one-hot encoded")
+            categories = block.categories
+            segment_slices.append((block.offset, block.width))
+            segment_categories.append(categories)
+        return segment_slices, segment_categories
+
+    def get_segment_code(self, segment: Tuple) -> int:
+        return int(
+            sum(
+                categories.index(category) * stride
+                for category, categories, stride in zip(segment, self.segment_categories, self._strides)
+            )
+        )
+
+    def get_segment_codes(self, X) -> np.ndarray:
+        """Returns the segment code of each encoded row, the last code for rows of an unseen category."""
+        codes = np.zeros(X.shape[0], dtype=np.intp)
+        unknown = np.zeros(X.shape[0], dtype=bool)
+        for (offset, width), stride in zip(self.segment_slices, self._strides):
+            block = X[:, offset:offset + width]
+            # An unseen category is encoded as all zeros by an encoder that ignores unknown categories
+            unknown |= block.max(axis=1) < 0.5
+            codes += block.argmax(axis=1) * stride
+        codes[unknown] = len(self._model_indices) - 1
+        return codes
+
+    def get_model_indices(self, X) -> np.ndarray:
+        return self._model_indices[self.get_segment_codes(X)]
+
+    def predict(self, X) -> np.ndarray:
+
+        """
+        Method Name :   predict
+
+        Description :   This method routes each encoded row to its segment's model. Rows are grouped by model
+                        and each group is predicted in one vectorized call, segments without a model of
+                        their own are predicted together by the global model.
+
+        Output      :   Predictions
+        """
+        X = X.toarray() if hasattr(X, "toarray") else np.asarray(X)
+        model_indices = self.get_model_indices(X)
+        used_indices = np.unique(model_indices)
+
+        # A single request, or a batch of one segment, needs no regrouping
+        if len(used_indices) == 1:
+            return np.asarray(self.models[used_indices[0]].predict(X), dtype=np.float64)
+
+        predictions = np.empty(len(X), dtype=np.float64)
+        for model_index in used_indices:
+            rows = np.flatnonzero(model_indices == model_index)
+            predictions[rows] = self.models[model_index].predict(X[rows])
+        return predictions
+
+    def __repr__(self):
+        return f"SegmentedModel({type(self.global_model).__name__}, {len(self.segment_models)} segments)"
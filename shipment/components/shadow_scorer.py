@@ -0,0 +1,172 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Sequence
+import numpy as np
+from shipment.constant import *
+from shipment.components.model_holder import ModelHolder
+from shipment.components.model_predictor import CostPredictor
+from shipment.logger import get_logger
+from shipment.utils.metrics import REGISTRY, capture_stage_timings
+
+logger = get_logger(__name__)
+
+
+SHADOW_REQUESTS = REGISTRY.counter(
+    "shipment_shadow_requests_total",
+    "Requests considered for shadow scoring, by result: scored, skipped, dropped or failed",
+    ["result"],
+)
+SHADOW_SECONDS = REGISTRY.histogram(
+    "shipment_shadow_seconds",
+    "Run time of the same CostPredictor call on the served and the challenger model, on shadowed requests "
+    "the served model scored unbatched and uncached",
+    ["model"],
+)
+SHADOW_ABS_DELTA = REGISTRY.histogram(
+    "shipment_shadow_abs_delta",
+    "Absolute difference between the challenger and the served prediction, per shipment",
+    buckets=(1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000),
+)
+
+
+class ShadowScorer:
+    def __init__(
+        self,
+        model_name: str = SHADOW_MODEL_NAME,
+        sample_rate: float = SHADOW_SAMPLE_RATE,
+        max_workers: int = SHADOW_MAX_WORKERS,
+        max_queue_depth: int = SHADOW_MAX_QUEUE_DEPTH,
+        cost_predictor: CostPredictor = None,
+    ):
+        self.model_name = model_name
+        self.sample_rate = sample_rate
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        if cost_predictor is None and model_name:
+            cost_predictor = CostPredictor(
+                model_holder=ModelHolder(
+                    model_name=model_name, artifact_format=SHADOW_MODEL_ARTIFACT_FORMAT, local_path=""
+                )
+            )
+        self.cost_predictor = cost_predictor
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.cost_predictor is not None and self.sample_rate > 0
+
+    def start(self) -> None:
+        if not self.enabled or self._executor is not None:
+            return
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="shadow"
+        )
+        # Loading the challenger in the background, so it is not loaded by the first shadowed request
+        self._executor.submit(self._load)
+        logger.info(f"Shadow scoring {self.sample_rate:.0%} of requests with challenger {self.model_name}")
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _load(self) -> None:
+        try:
+            self.cost_predictor.model_holder.get_model()
+        except Exception as e:
+            logger.error(f"Loading the challenger model failed: {e}")
+
+    def _release(self, _) -> None:
+        with self._pending_lock:
+            self._pending -= 1
+
+    def submit(
+        self,
+        method_name: str,
+        payload: Sequence,
+        champion_predictions: Sequence[float],
+        champion_version: Optional[str],
+        champion_seconds: Optional[float] = None,
+    ) -> None:
+
+        """
+        Method Name :   submit
+
+        Description :   This method schedules the challenger on payload for a sample_rate share of the calls and
+                        returns at once. Calls beyond max_queue_depth pending ones are dropped, so a slow
+                        challenger never builds up a backlog. champion_seconds is the run time of the served
+                        model's own method_name call on payload. Predictions that came from the cache or a
+                        micro-batch have no comparable time, they pass None and only their deltas are recorded.
+
+        Output      :   None
+        """
+        if self._executor is None:
+            return
+        if random.random() >= self.sample_rate:
+            SHADOW_REQUESTS.inc(result="skipped")
+            return
+
+        with self._pending_lock:
+            if self._pending >= self.max_queue_depth:
+                SHADOW_REQUESTS.inc(result="dropped")
+                return
+            self._pending += 1
+
+        try:
+            job = self._executor.submit(
+                self._score, method_name, payload, champion_predictions, champion_version, champion_seconds
+            )
+        except RuntimeError:
+            # The executor was shut down in the meantime
+            self._release(None)
+            return
+        job.add_done_callback(self._release)
+
+    def _score(
+        self,
+        method_name: str,
+        payload: Sequence,
+        champion_predictions: Sequence[float],
+        champion_version: Optional[str],
+        champion_seconds: Optional[float],
+    ) -> None:
+        try:
+            started_at = time.perf_counter()
+            # Keeping the challenger's stage timings out of the served model's latency histograms
+            with capture_stage_timings():
+                challenger_predictions = getattr(self.cost_predictor, method_name)(payload)
+            challenger_seconds = time.perf_counter() - started_at
+
+            deltas = np.asarray(challenger_predictions, dtype=np.float64) - np.asarray(
+                champion_predictions, dtype=np.float64
+            )
+            for delta in np.abs(deltas):
+                SHADOW_ABS_DELTA.observe(delta)
+            if champion_seconds is not None:
+                SHADOW_SECONDS.observe(champion_seconds, model="champion")
+                SHADOW_SECONDS.observe(challenger_seconds, model="challenger")
+            SHADOW_REQUESTS.inc(result="scored")
+
+            logger.info(
+                "Shadow scored request",
+                extra={
+                    "champion_version": champion_version,
+                    "challenger_version": self.cost_predictor.model_holder.version,
+                    "rows": len(deltas),
+                    "mean_delta": float(deltas.mean()),
+                    "mean_abs_delta": float(np.abs(deltas).mean()),
+                    "max_abs_delta": float(np.abs(deltas).max()),
+                    "champion_seconds": champion_seconds,
+                    "challenger_seconds": challenger_seconds,
+                },
+            )
+
+        except Exception as e:
+            SHADOW_REQUESTS.inc(result="failed")
+            logger.error(f"Shadow scoring failed: {e}")
@@ -0,0 +1,110 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+from shipment.constant import *
+from shipment.exception import ProfilerBusyException
+from shipment.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# Leaf frames of threads parked waiting for work, dropped unless idle stacks are asked for
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+
+class StackProfile:
+    def __init__(self, stacks: Counter, samples: int, seconds: float, interval: float):
+        # Folded stack "root;...;leaf" -> number of samples it was seen in
+        self.stacks = stacks
+        self.samples = samples
+        self.seconds = seconds
+        self.interval = interval
+
+    def to_folded(self) -> str:
+        """Returns the stacks in the folded format read by flamegraph.pl, speedscope and inferno."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    # The definition line keeps every sample of a function in one flame graph box
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _thread_label(thread: Optional[threading.Thread], thread_id: int) -> str:
+    if thread is None:
+        return f"thread-{thread_id}"
+    # Pool threads are numbered, their samples belong together
+    return re.sub(r"[_-]\d+$", "", thread.name)
+
+
+class StackProfiler:
+    def __init__(
+        self,
+        max_seconds: float = DEBUG_PROFILE_MAX_SECONDS,
+        interval_ms: float = DEBUG_PROFILE_INTERVAL_MS,
+    ):
+        self.max_seconds = max_seconds
+        self.interval = interval_ms / 1000
+        # One profile at a time, two samplers would only slow the worker down twice
+        self._lock = threading.Lock()
+
+    def sample(self, seconds: float, include_idle: bool = False) -> StackProfile:
+
+        """
+        Method Name :   sample
+
+        Description :   This method samples the Python stacks of every thread of this process for the given
+                        number of seconds, capped at max_seconds, and counts the folded stacks. It blocks the
+                        calling thread, so the serving threads keep working while they are sampled.
+
+        Output      :   StackProfile
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyException("A profile is already being taken in this process")
+
+        try:
+            seconds = min(max(seconds, self.interval), self.max_seconds)
+            own_thread_id = threading.get_ident()
+            stacks: Counter = Counter()
+            samples = 0
+            logger.info(f"Sampling stacks for {seconds} seconds every {self.interval * 1000:g} ms")
+
+            started_at = time.perf_counter()
+            deadline = started_at + seconds
+            while time.perf_counter() < deadline:
+                threads: Dict[int, threading.Thread] = {thread.ident: thread for thread in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread_id:
+                        continue
+                    if not include_idle and (
+                        os.path.basename(frame.f_code.co_filename), frame.f_code.co_name
+                    ) in IDLE_FRAMES:
+                        continue
+
+                    labels = []
+                    while frame is not None:
+                        labels.append(_frame_label(frame))
+                        frame = frame.f_back
+                    labels.append(_thread_label(threads.get(thread_id), thread_id))
+                    stacks[";".join(reversed(labels))] += 1
+
+                samples += 1
+                time.sleep(self.interval)
+
+            elapsed = time.perf_counter() - started_at
+            logger.info(f"Took {samples} stack samples in {elapsed:.2f} seconds, {len(stacks)} distinct stacks")
+            return StackProfile(stacks, samples, elapsed, self.interval)
+
+        finally:
+            self._lock.release()
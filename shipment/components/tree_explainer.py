@@ -0,0 +1,130 @@
+from typing import Dict, List, Tuple
+import numpy as np
+
+
+# Decision path entries handled at once by the random forest contributions, keeps the indicator around 32MB
+DECISION_PATH_CELLS = 1 << 22
+
+
+class Explanation:
+    def __init__(
+        self,
+        base_values: np.ndarray,
+        contributions: np.ndarray,
+        columns: List[str],
+        predictions: np.ndarray = None,
+    ):
+        summed = base_values + contributions.sum(axis=1)
+        if predictions is None:
+            predictions = summed
+        else:
+            # The contributions are computed in lower precision than the model's own predictions, the rounding
+            # residual goes to the base value so the parts still add up to the prediction that is returned
+            base_values = base_values + (np.asarray(predictions, dtype=np.float64) - summed)
+        # Predictions of the model, base_values[i] + contributions[i].sum() is predictions[i]
+        self.predictions = predictions
+        self.base_values = base_values
+        # Contribution of each input column to each prediction, in the order of columns
+        self.contributions = contributions
+        self.columns = columns
+
+    def to_records(self, column_names: Dict[str, str] = None, digits: int = 2) -> List[Dict]:
+        """Returns one {"base_value", "contributions"} dict per row, with the columns renamed by column_names."""
+        column_names = column_names or {}
+        names = [column_names.get(column, column) for column in self.columns]
+        return [
+            {
+                "base_value": round(float(base_value), digits),
+                "contributions": {name: round(float(value), digits) for name, value in zip(names, row)},
+            }
+            for base_value, row in zip(self.base_values, self.contributions)
+        ]
+
+
+def get_tree_contributions(model, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+
+    """
+    Method Name :   get_tree_contributions
+
+    Description :   This function splits the predictions of a fitted tree model into a base value and one
+                    contribution per encoded feature, for all rows at once. XGBoost uses its own SHAP
+                    values (pred_contribs), scikit-learn tree ensembles use Saabas path contributions
+                    computed from decision_path. A segmented model explains the rows of each segment with
+                    that segment's model.
+
+    Output      :   Tuple of base values (n_rows,) and contributions (n_rows, n_features)
+    """
+    if hasattr(model, "segment_models"):
+        return _get_segmented_contributions(model, X)
+    if hasattr(model, "get_booster"):
+        return _get_xgboost_contributions(model, X)
+    if hasattr(model, "estimators_") and hasattr(model, "decision_path"):
+        return _get_forest_contributions(model, model.estimators_, X)
+    if hasattr(model, "tree_"):
+        return _get_forest_contributions(model, [model], X)
+    raise ValueError(f"Explaining {type(model).__name__} predictions is not supported")
+
+
+def _get_segmented_contributions(model, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    X = np.asarray(X)
+    base_values = np.empty(len(X), dtype=np.float64)
+    contributions = np.empty(X.shape, dtype=np.float64)
+    # Each segment's rows are explained by the model that predicted them
+    model_indices = model.get_model_indices(X)
+    for model_index in np.unique(model_indices):
+        rows = np.flatnonzero(model_indices == model_index)
+        base_values[rows], contributions[rows] = get_tree_contributions(model.models[model_index], X[rows])
+    return base_values, contributions
+
+
+def _get_xgboost_contributions(model, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    import xgboost
+
+    booster = model.get_booster()
+    # A model fitted on a DataFrame validates the feature names, which a plain array does not carry
+    dmatrix = xgboost.DMatrix(X, missing=model.missing, feature_names=booster.feature_names)
+    contributions = booster.predict(dmatrix, pred_contribs=True).astype(np.float64)
+    # The last column is the bias, the base score plus the expected value of the trees
+    return contributions[:, -1], contributions[:, :-1]
+
+
+def _get_forest_contributions(model, estimators, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    X = np.asarray(X, dtype=np.float32)
+    n_rows, n_features = X.shape
+
+    node_values = np.concatenate([estimator.tree_.value[:, 0, 0] for estimator in estimators])
+    node_features = np.concatenate([estimator.tree_.feature for estimator in estimators])
+    node_counts = [estimator.tree_.node_count for estimator in estimators]
+    tree_starts = np.cumsum([0] + node_counts[:-1])
+    base_value = float(node_values[tree_starts].mean())
+
+    contributions = np.zeros((n_rows, n_features), dtype=np.float64)
+    max_depth = max(estimator.tree_.max_depth for estimator in estimators) + 1
+    block_size = max(1, DECISION_PATH_CELLS // (len(estimators) * max_depth))
+
+    for start in range(0, n_rows, block_size):
+        block = X[start:start + block_size]
+        # A forest also returns the node offset of each tree, a single tree only the indicator
+        indicator = model.decision_path(block)
+        if isinstance(indicator, tuple):
+            indicator = indicator[0]
+        indicator = indicator.tocsr()
+        indicator.sort_indices()
+
+        # Each row lists the nodes of every tree it visits, parents before children and tree after tree,
+        # so consecutive nodes of one row in one tree are the edges of its decision path
+        nodes = indicator.indices
+        rows = np.repeat(np.arange(len(block)), np.diff(indicator.indptr))
+        trees = np.searchsorted(tree_starts, nodes, side="right")
+        edge = (rows[1:] == rows[:-1]) & (trees[1:] == trees[:-1])
+        parents, children, edge_rows = nodes[:-1][edge], nodes[1:][edge], rows[:-1][edge]
+
+        contributions[start:start + len(block)] = np.bincount(
+            edge_rows * n_features + node_features[parents],
+            weights=node_values[children] - node_values[parents],
+            minlength=len(block) * n_features,
+        ).reshape(len(block), n_features)
+
+    # A forest averages its trees
+    contributions /= len(estimators)
+    return np.full(n_rows, base_value), contributions
@@ -0,0 +1,209 @@
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+from typing import Dict, Optional, Tuple
+from botocore.exceptions import ClientError
+from shipment.constant import *
+from shipment.exception import ShippingException
+from shipment.logger import logging
+from shipment.utils.metrics import REGISTRY
+
+
+ARTIFACT_CACHE_EVENTS = REGISTRY.counter(
+    "shipment_artifact_cache_events_total",
+    "S3 artifact disk cache lookups and evictions by event: hit, revalidated, miss or evict",
+    ["event"],
+)
+ARTIFACT_CACHE_BYTES = REGISTRY.gauge(
+    "shipment_artifact_cache_bytes", "Size of the S3 artifacts held in the local disk cache"
+)
+
+OBJECTS_DIR = "objects"
+REFS_DIR = "refs"
+
+
+class ArtifactCache:
+    def __init__(self, cache_dir: str = ARTIFACT_CACHE_DIR, max_mb: float = ARTIFACT_CACHE_MAX_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.objects_dir = os.path.join(cache_dir, OBJECTS_DIR)
+        self.refs_dir = os.path.join(cache_dir, REFS_DIR)
+        # Serializes eviction within the process, files are only ever replaced atomically across processes
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _get_object_path(self, etag: str) -> str:
+        # ETags are hex digests, with a part count suffix for multipart uploads
+        name = etag if re.fullmatch(r"[0-9a-fA-F]+(-\d+)?", etag) else hashlib.sha256(etag.encode()).hexdigest()
+        return os.path.join(self.objects_dir, name)
+
+    def _get_ref_path(self, bucket_name: str, key: str, version_id: Optional[str]) -> str:
+        ref = f"{bucket_name}/{key}@{version_id or ''}"
+        return os.path.join(self.refs_dir, hashlib.sha256(ref.encode()).hexdigest() + ".json")
+
+    def _read_ref(self, ref_path: str) -> Optional[str]:
+        try:
+            with open(ref_path) as file_obj:
+                return json.load(file_obj)["etag"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_atomic(self, path: str, content: bytes) -> None:
+        # Readers, in this or another process, see the old file or the complete new one, never a partial one
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as file_obj:
+                file_obj.write(content)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _touch(self, path: str) -> bool:
+        # The modification time orders the objects for eviction, least recently used first
+        try:
+            os.utime(path)
+            return True
+        except OSError:
+            return False
+
+    def get_file(
+        self, s3, bucket_name: str, key: str, version_id: Optional[str] = None
+    ) -> Tuple[str, str]:
+
+        """
+        Method Name :   get_file
+
+        Description :   This method returns a local copy of the key object, or of its version_id version, using
+                        s3, an S3Operation, to download it. A cached copy of the latest version is revalidated
+                        with a conditional HEAD (If-None-Match), so an unchanged object is not downloaded
+                        again. A pinned version never changes and is served from disk without any request.
+
+        Output      :   Tuple of the local file path and the object ETag
+        """
+        try:
+            ref_path = self._get_ref_path(bucket_name, key, version_id)
+            cached_etag = self._read_ref(ref_path)
+            cached_path = None if cached_etag is None else self._get_object_path(cached_etag)
+            if cached_path is not None and not os.path.exists(cached_path):
+                cached_etag = cached_path = None
+
+            if cached_path is not None and version_id is not None and self._touch(cached_path):
+                ARTIFACT_CACHE_EVENTS.inc(event="hit")
+                return cached_path, cached_etag
+
+            request = {"Bucket": bucket_name, "Key": key}
+            if version_id is not None:
+                request["VersionId"] = version_id
+            if cached_etag is not None:
+                request["IfNoneMatch"] = f'"{cached_etag}"'
+
+            try:
+                head = s3.s3_client.head_object(**request)
+            except ClientError as e:
+                if cached_path is not None and e.response["Error"]["Code"] in ("304", "NotModified"):
+                    if self._touch(cached_path):
+                        ARTIFACT_CACHE_EVENTS.inc(event="revalidated")
+                        logging.info(f"Cached {key} is up to date with ETag {cached_etag}")
+                        return cached_path, cached_etag
+                    # Evicted by another process since it was found, fetching it unconditionally
+                    request.pop("IfNoneMatch")
+                    head = s3.s3_client.head_object(**request)
+                else:
+                    raise
+
+            etag = head["ETag"].strip('"')
+            object_path = self._get_object_path(etag)
+            # Downloaded and verified under a temporary name, then moved into place
+            os.makedirs(self.objects_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.objects_dir, prefix=".tmp-")
+            os.close(fd)
+            try:
+                s3.download_verified_file(key, bucket_name, tmp_path, version_id, head)
+                os.replace(tmp_path, object_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+            ref = {"bucket": bucket_name, "key": key, "version_id": version_id, "etag": etag}
+            self._write_atomic(ref_path, json.dumps(ref).encode())
+            ARTIFACT_CACHE_EVENTS.inc(event="miss")
+            logging.info(f"Downloaded {key} with ETag {etag} into the artifact cache")
+
+            self.evict(keep=object_path)
+            return object_path, etag
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+    def evict(self, keep: str = None) -> int:
+
+        """
+        Method Name :   evict
+
+        Description :   This method removes the least recently used objects until the cache fits in its size
+                        budget. The keep object, just downloaded, is never removed. References to removed
+                        objects are left behind and are ignored on lookup.
+
+        Output      :   Number of removed objects
+        """
+        with self._lock:
+            objects: Dict[str, os.stat_result] = {}
+            try:
+                names = os.listdir(self.objects_dir)
+            except FileNotFoundError:
+                names = []
+            for name in names:
+                if name.startswith(".tmp-"):
+                    continue
+                path = os.path.join(self.objects_dir, name)
+                try:
+                    objects[path] = os.stat(path)
+                except FileNotFoundError:
+                    continue
+
+            total = sum(stat.st_size for stat in objects.values())
+            removed = 0
+            for path, stat in sorted(objects.items(), key=lambda item: item[1].st_mtime):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= stat.st_size
+                removed += 1
+                ARTIFACT_CACHE_EVENTS.inc(event="evict")
+                logging.info(f"Evicted {os.path.basename(path)} from the artifact cache")
+
+            ARTIFACT_CACHE_BYTES.set(total)
+            return removed
+
+
+
+_artifact_cache: Optional[ArtifactCache] = None
+_artifact_cache_lock = threading.Lock()
+
+
+def get_artifact_cache() -> ArtifactCache:
+    """Returns the process-wide ArtifactCache, creating it on first use."""
+    global _artifact_cache
+    if _artifact_cache is None:
+        with _artifact_cache_lock:
+            if _artifact_cache is None:
+                _artifact_cache = ArtifactCache()
+    return _artifact_cache
@@ -2,19 +2,20 @@
 
 import sys
 from json import loads
+from os import environ
 from typing import Collection
 from pandas import DataFrame
 from pymongo.database import Database
 import pandas as pd
 from pymongo import MongoClient
-from shipment.constant import DB_URL
+from shipment.constant import DB_URL_ENV_KEY
 from shipment.exception import ShippingException
 from shipment.logger import logging
 
 
 class MongoDBOperation:
     def __init__(self) -> None:
-        self.DB_URL = DB_URL
+        self.DB_URL = environ[DB_URL_ENV_KEY]
         self.client = MongoClient(self.DB_URL)
 
     
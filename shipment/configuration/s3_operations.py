@@ -1,22 +1,44 @@
+import hashlib
 import os
 import pickle
 import sys
+import tempfile
 from io import StringIO
-from typing import List, Union
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
 from shipment.constant import *
 import boto3
+from boto3.s3.transfer import TransferConfig
+from shipment.configuration.artifact_cache import ArtifactCache, get_artifact_cache
 from shipment.exception import ShippingException
 from botocore.exceptions import ClientError
-from mypy_boto3_s3.service_resource import Bucket
 from pandas import DataFrame, read_csv
 from shipment.logger import logging
 
+if TYPE_CHECKING:
+    from mypy_boto3_s3.service_resource import Bucket
+
 
 
 class S3Operation:
-    def __init__(self):
+    def __init__(self, artifact_cache: ArtifactCache = None):
         self.s3_client = boto3.client("s3")
         self.s3_resource = boto3.resource("s3")
+        self.artifact_cache = artifact_cache if artifact_cache is not None else get_artifact_cache()
+        # Objects above the threshold move as parts in parallel, ranged GETs on download
+        self.transfer_config = TransferConfig(
+            multipart_threshold=int(S3_MULTIPART_THRESHOLD_MB * 1024 * 1024),
+            multipart_chunksize=int(S3_MULTIPART_CHUNK_MB * 1024 * 1024),
+            max_concurrency=S3_MAX_CONCURRENCY,
+            max_bandwidth=int(S3_MAX_BANDWIDTH_MB * 1024 * 1024) or None,
+        )
+
+    @staticmethod
+    def get_file_sha256(filename: str) -> str:
+        digest = hashlib.sha256()
+        with open(filename, "rb") as file_obj:
+            for chunk in iter(lambda: file_obj.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
 
     @staticmethod
     def read_object(
@@ -45,7 +67,7 @@ class S3Operation:
         except Exception as e:
             raise ShippingException(e, sys) from e
 
-    def get_bucket(self, bucket_name: str) -> Bucket:
+    def get_bucket(self, bucket_name: str) -> "Bucket":
 
         """
         Method Name :   get_bucket
@@ -129,15 +151,205 @@ class S3Operation:
                 else model_dir + "/" + model_name
             )
             model_file = func()
-            f_obj = self.get_file_object(model_file, bucket_name)
-            model_obj = self.read_object(f_obj, decode=False)
-            model = pickle.loads(model_obj)
+            model, _ = self.load_model_file(model_file, bucket_name)
             logging.info("Exited the load_model method of S3Operations class")
             return model
 
         except Exception as e:
             raise ShippingException(e, sys) from e
 
+    def get_object_etag(self, filename: str, bucket_name: str) -> Optional[str]:
+
+        """
+        Method Name :   get_object_etag
+
+        Description :   This method fetches the ETag of the filename object with a HEAD request, without downloading it
+        
+        Output      :   ETag of the object, or None if the object is not present in the bucket
+        """
+        logging.info("Entered the get_object_etag method of S3Operations class")
+        try:
+            response = self.s3_client.head_object(Bucket=bucket_name, Key=filename)
+            logging.info("Exited the get_object_etag method of S3Operations class")
+            return response["ETag"].strip('"')
+
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                return None
+            raise ShippingException(e, sys) from e
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+    def load_model_with_etag(
+        self, model_name: str, bucket_name: str, model_dir: str = None, version_id: str = None
+    ) -> Tuple[object, str]:
+
+        """
+        Method Name :   load_model_with_etag
+
+        Description :   This method loads the model_name from bucket_name bucket together with the ETag of the
+                        exact object version that was downloaded. version_id loads an older version of the
+                        object instead of the latest one.
+        
+        Output      :   Tuple of model object and its ETag
+        """
+        logging.info("Entered the load_model_with_etag method of S3Operations class")
+
+        try:
+            model_file = model_name if model_dir is None else model_dir + "/" + model_name
+            model, etag = self.load_model_file(model_file, bucket_name, version_id)
+            logging.info("Exited the load_model_with_etag method of S3Operations class")
+            return model, etag
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+    def load_model_file(
+        self, model_file: str, bucket_name: str, version_id: str = None
+    ) -> Tuple[object, str]:
+
+        """
+        Method Name :   load_model_file
+
+        Description :   This method downloads the model_file model to disk, through the local artifact cache when
+                        it is enabled, and unpickles it from the file once its checksum is verified
+        
+        Output      :   Tuple of model object and its ETag
+        """
+        logging.info("Entered the load_model_file method of S3Operations class")
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                if self.artifact_cache.enabled:
+                    local_file, etag = self.artifact_cache.get_file(self, bucket_name, model_file, version_id)
+                else:
+                    local_file = os.path.join(tmp_dir, os.path.basename(model_file))
+                    etag = self.download_verified_file(model_file, bucket_name, local_file, version_id)
+
+                with open(local_file, "rb") as file_obj:
+                    model = pickle.load(file_obj)
+            logging.info("Exited the load_model_file method of S3Operations class")
+            return model, etag
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+    def download_verified_file(
+        self,
+        filename: str,
+        bucket_name: str,
+        local_filename: str,
+        version_id: str = None,
+        head: Dict = None,
+    ) -> str:
+
+        """
+        Method Name :   download_verified_file
+
+        Description :   This method downloads the filename object with parallel ranged GETs and checks the file
+                        against the sha256 stored in the object metadata on upload. head is the HEAD response
+                        of the object if the caller already has it.
+        
+        Output      :   ETag of the downloaded object
+        """
+        logging.info("Entered the download_verified_file method of S3Operations class")
+        try:
+            if head is None:
+                version_kwargs = {} if version_id is None else {"VersionId": version_id}
+                head = self.s3_client.head_object(Bucket=bucket_name, Key=filename, **version_kwargs)
+
+            # Downloading the exact version the HEAD described, so the parts and the checksum belong together
+            object_version = version_id or head.get("VersionId")
+            extra_args = {} if object_version in (None, "null") else {"VersionId": object_version}
+            self.s3_client.download_file(
+                bucket_name, filename, local_filename, ExtraArgs=extra_args, Config=self.transfer_config
+            )
+
+            expected_sha256 = head.get("Metadata", {}).get(S3_SHA256_METADATA_KEY)
+            if expected_sha256 is None:
+                logging.info(f"{filename} has no {S3_SHA256_METADATA_KEY} metadata, it was uploaded unverified")
+            elif self.get_file_sha256(local_filename) != expected_sha256:
+                raise ValueError(f"Checksum mismatch for {filename} in {bucket_name} bucket")
+
+            logging.info("Exited the download_verified_file method of S3Operations class")
+            return head["ETag"].strip('"')
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+    def read_object_with_etag(
+        self, filename: str, bucket_name: str, version_id: str = None
+    ) -> Tuple[bytes, str]:
+
+        """
+        Method Name :   read_object_with_etag
+
+        Description :   This method reads the filename object from bucket_name bucket together with its ETag,
+                        from the version_id version of the object if given
+        
+        Output      :   Tuple of object content and its ETag
+        """
+        logging.info("Entered the read_object_with_etag method of S3Operations class")
+        try:
+            version_kwargs = {} if version_id is None else {"VersionId": version_id}
+            response = self.s3_client.get_object(Bucket=bucket_name, Key=filename, **version_kwargs)
+            content = response["Body"].read()
+            logging.info("Exited the read_object_with_etag method of S3Operations class")
+            return content, response["ETag"].strip('"')
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+    def get_object_versions(self, filename: str, bucket_name: str) -> List[Dict]:
+
+        """
+        Method Name :   get_object_versions
+
+        Description :   This method lists the stored versions of the filename object, newest first. A bucket
+                        without versioning reports only the current object, with VersionId "null".
+        
+        Output      :   List of dicts with VersionId, ETag, Size, LastModified and IsLatest
+        """
+        logging.info("Entered the get_object_versions method of S3Operations class")
+        try:
+            versions = []
+            paginator = self.s3_client.get_paginator("list_object_versions")
+            for page in paginator.paginate(Bucket=bucket_name, Prefix=filename):
+                for version in page.get("Versions", []):
+                    # The prefix also matches longer keys
+                    if version["Key"] == filename:
+                        versions.append(
+                            {
+                                "VersionId": version["VersionId"],
+                                "ETag": version["ETag"].strip('"'),
+                                "Size": version["Size"],
+                                "LastModified": version["LastModified"],
+                                "IsLatest": version["IsLatest"],
+                            }
+                        )
+            logging.info("Exited the get_object_versions method of S3Operations class")
+            return versions
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
+    def download_file(self, filename: str, bucket_name: str, local_filename: str) -> None:
+
+        """
+        Method Name :   download_file
+
+        Description :   This method downloads the filename object from bucket_name bucket to local_filename
+        
+        Output      :   File is written to local_filename
+        """
+        logging.info("Entered the download_file method of S3Operations class")
+        try:
+            self.s3_client.download_file(bucket_name, filename, local_filename, Config=self.transfer_config)
+            logging.info("Exited the download_file method of S3Operations class")
+
+        except Exception as e:
+            raise ShippingException(e, sys) from e
+
     def create_folder(self, folder_name: str, bucket_name: str) -> None:
 
         """
@@ -181,8 +393,14 @@ class S3Operation:
                 f"Uploading {from_filename} file to {to_filename} file in {bucket_name} bucket"
             )
 
+            # S3 checks each part against its SHA256 on upload, the sha256 of the whole file is kept in the
+            # metadata so downloads can verify the artifact end to end
+            extra_args = {
+                "Metadata": {S3_SHA256_METADATA_KEY: self.get_file_sha256(from_filename)},
+                "ChecksumAlgorithm": "SHA256",
+            }
             self.s3_resource.meta.client.upload_file(
-                from_filename, bucket_name, to_filename
+                from_filename, bucket_name, to_filename, ExtraArgs=extra_args, Config=self.transfer_config
             )
             logging.info(
                 f"Uploaded {from_filename} file to {to_filename} file in {bucket_name} bucket"
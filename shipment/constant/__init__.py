@@ -1,4 +1,5 @@
 import os
+import tempfile
 from os import environ
 from datetime import datetime
 from from_root.root import from_root
@@ -8,7 +9,8 @@ TIMESTAMP:str = datetime.now().strftime("%m_%d_%Y_%H_%M_%S")
 MODEL_CONFIG_FILE = "config/model.yaml"
 SCHEMA_FILE_PATH = "config/schema.yaml"
 
-DB_URL = environ["MONGO_DB_URL"]
+# Read when a MongoDB client is created, so a serving-only process does not need it
+DB_URL_ENV_KEY = "MONGO_DB_URL"
 
 TARGET_COLUMN = "Cost"
 DB_NAME = "shipping"
@@ -42,6 +44,7 @@ TRANSFORMED_TEST_DATA_DIR = "TransformedTest"
 TRANSFORMED_TRAIN_DATA_FILE_NAME = "transformed_train_data.npz"
 TRANSFORMED_TEST_DATA_FILE_NAME = "transformed_test_data.npz"
 PREPROCESSOR_OBJECT_FILE_NAME = "shipping_preprocessor.pkl"
+FEATURE_ENCODER_FILE_NAME = "shipping_feature_encoder.pkl"
 
 
 """
@@ -50,6 +53,8 @@ Model Training Constants
 MODEL_TRAINER_ARTIFACTS_DIR = "ModelTrainerArtifacts"
 MODEL_FILE_NAME = "shipping_price_model.pkl"
 MODEL_SAVE_FORMAT = ".pkl"
+MAPPED_MODEL_DIR_NAME = "shipping_price_model_mapped"
+MAPPED_MODEL_MANIFEST_FILE_NAME = "manifest.json"
 
 
 """
@@ -57,6 +62,95 @@ Model Evaluation Constants
 """
 BUCKET_NAME = "shipmentprice-predmodel-io-files"
 S3_MODEL_NAME = "shipping_price_model.pkl"
+S3_MAPPED_MODEL_MANIFEST_KEY = MAPPED_MODEL_DIR_NAME + "/" + MAPPED_MODEL_MANIFEST_FILE_NAME
+
+
+"""
+Logging Constants
+"""
+LOG_DIR = "logs"
+LOG_LEVEL = environ.get("SHIPMENT_LOG_LEVEL", "INFO")
+# Comma separated logger=level pairs, e.g. "shipment.utils.main_utils=WARNING"
+LOG_LEVELS = environ.get("SHIPMENT_LOG_LEVELS", "")
+# Comma separated logger=rate pairs, the share of records below WARNING that are kept
+LOG_SAMPLING_RATES = environ.get("SHIPMENT_LOG_SAMPLING_RATES", "")
+LOG_FORMAT = environ.get("SHIPMENT_LOG_FORMAT", "json")
+LOG_QUEUE_MAX_SIZE = int(environ.get("SHIPMENT_LOG_QUEUE_MAX_SIZE", 10000))
+
+
+"""
+Model Serving Constants
+"""
+MODEL_RELOAD_INTERVAL_SECONDS = float(environ.get("MODEL_RELOAD_INTERVAL_SECONDS", 300))
+MODEL_ARTIFACT_FORMAT = environ.get("MODEL_ARTIFACT_FORMAT", "pickle")
+# Serves a model file (or mapped model directory) from local disk instead of the s3 bucket, e.g. for load tests
+LOCAL_MODEL_PATH = environ.get("SHIPMENT_LOCAL_MODEL_PATH", "")
+MAPPED_MODEL_CACHE_DIR = environ.get(
+    "MAPPED_MODEL_CACHE_DIR", os.path.join(tempfile.gettempdir(), "shipment-models")
+)
+# Local disk cache of the artifacts downloaded from the s3 bucket, keyed by ETag and shared by the serving app and
+# the training pipeline. A size of 0 disables it.
+ARTIFACT_CACHE_DIR = environ.get(
+    "ARTIFACT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "shipment-artifacts")
+)
+ARTIFACT_CACHE_MAX_MB = float(environ.get("ARTIFACT_CACHE_MAX_MB", 2048))
+# Multipart transfers of artifacts: objects above the threshold move as parts of the chunk size, with up to
+# max concurrency parts in flight, capped at max bandwidth MB/s (0 is unlimited)
+S3_MULTIPART_THRESHOLD_MB = float(environ.get("S3_MULTIPART_THRESHOLD_MB", 16))
+S3_MULTIPART_CHUNK_MB = float(environ.get("S3_MULTIPART_CHUNK_MB", 16))
+S3_MAX_CONCURRENCY = int(environ.get("S3_MAX_CONCURRENCY", 10))
+S3_MAX_BANDWIDTH_MB = float(environ.get("S3_MAX_BANDWIDTH_MB", 0))
+# Object metadata key holding the sha256 of an uploaded artifact
+S3_SHA256_METADATA_KEY = "sha256"
+# Requests pin an older model version, an S3 VersionId or ETag of the model object, with this header
+MODEL_VERSION_HEADER = "X-Model-Version"
+MODEL_REGISTRY_MEMORY_BUDGET_MB = float(environ.get("MODEL_REGISTRY_MEMORY_BUDGET_MB", 1024))
+# Pinned versions found missing are answered with 404 for this long without listing the bucket again
+MODEL_REGISTRY_MISSING_TTL_SECONDS = float(environ.get("MODEL_REGISTRY_MISSING_TTL_SECONDS", 60))
+PREDICT_BATCH_MAX_SIZE = int(environ.get("PREDICT_BATCH_MAX_SIZE", 1000))
+ARROW_BATCH_MAX_BYTES = int(environ.get("ARROW_BATCH_MAX_BYTES", 256 * 1024 * 1024))
+BULK_PREDICT_CHUNK_SIZE = int(environ.get("BULK_PREDICT_CHUNK_SIZE", 10000))
+BULK_PREDICT_ID_COLUMN = "Customer Id"
+MICRO_BATCH_MAX_SIZE = int(environ.get("MICRO_BATCH_MAX_SIZE", 64))
+MICRO_BATCH_MAX_WAIT_MS = float(environ.get("MICRO_BATCH_MAX_WAIT_MS", 2))
+INFERENCE_POOL_KIND = environ.get("INFERENCE_POOL_KIND", "thread")
+INFERENCE_POOL_WORKERS = int(environ.get("INFERENCE_POOL_WORKERS", os.cpu_count() or 1))
+INFERENCE_POOL_MAX_QUEUE_DEPTH = int(environ.get("INFERENCE_POOL_MAX_QUEUE_DEPTH", 256))
+INFERENCE_TIMEOUT_SECONDS = float(environ.get("INFERENCE_TIMEOUT_SECONDS", 10))
+PREDICTION_CACHE_MAX_SIZE = int(environ.get("PREDICTION_CACHE_MAX_SIZE", 10000))
+PREDICTION_CACHE_TTL_SECONDS = float(environ.get("PREDICTION_CACHE_TTL_SECONDS", 300))
+WARMUP_RETRY_SECONDS = float(environ.get("WARMUP_RETRY_SECONDS", 10))
+# Comma separated [METHOD ]route=max_concurrency:max_queue:deadline_seconds limits of admission control, a route
+# without limits is not admission controlled and a route without a method is limited for every method
+ADMISSION_LIMITS = environ.get(
+    "ADMISSION_LIMITS",
+    "POST /predict=64:256:2,POST /v1/predict=64:256:2,POST /predict/batch=8:32:10,POST /predict/bulk=2:2:30,"
+    "GET /train=1:0:1",
+)
+
+# S3 key of the challenger model scored in the shadow of the served one, empty disables shadow scoring
+SHADOW_MODEL_NAME = environ.get("SHADOW_MODEL_NAME", "")
+SHADOW_MODEL_ARTIFACT_FORMAT = environ.get("SHADOW_MODEL_ARTIFACT_FORMAT", MODEL_ARTIFACT_FORMAT)
+SHADOW_SAMPLE_RATE = float(environ.get("SHADOW_SAMPLE_RATE", 0.1))
+SHADOW_MAX_WORKERS = int(environ.get("SHADOW_MAX_WORKERS", 1))
+SHADOW_MAX_QUEUE_DEPTH = int(environ.get("SHADOW_MAX_QUEUE_DEPTH", 64))
+
+
+# Token the /debug/profile route must be called with in the X-Debug-Token header, empty disables the route
+DEBUG_PROFILE_TOKEN = environ.get("DEBUG_PROFILE_TOKEN", "")
+DEBUG_TOKEN_HEADER = "X-Debug-Token"
+DEBUG_PROFILE_MAX_SECONDS = float(environ.get("DEBUG_PROFILE_MAX_SECONDS", 60))
+DEBUG_PROFILE_INTERVAL_MS = float(environ.get("DEBUG_PROFILE_INTERVAL_MS", 5))
+
+
+"""
+Training Job Constants
+"""
+TRAINING_JOB_NICENESS = int(environ.get("TRAINING_JOB_NICENESS", 10))
+TRAINING_JOB_HISTORY = 20
+# State of the training jobs, shared by every serving worker on the host, which is what makes a training run
+# single-flight across uvicorn workers
+TRAINING_JOB_DIR = environ.get("TRAINING_JOB_DIR", os.path.join(from_root(), "artifacts", "training_jobs"))
 
 
 """
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Optional
 
 
 # Data Ingestion Artifacts:
@@ -21,12 +22,14 @@ class DataTransformationArtifacts:
     transformed_object_file_path: str
     transformed_train_file_path: str
     transformed_test_file_path: str
+    feature_encoder_file_path: Optional[str] = None
 
 
 # Model Trainer Artifacts:
 @dataclass
 class ModelTrainerArtifacts:
     trained_model_file_path:str
+    mapped_model_dir: Optional[str] = None
 
 # Model Evaluation Artifacts
 @dataclass
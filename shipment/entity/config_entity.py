@@ -53,6 +53,10 @@ class DataTransformationConfig:
                                                    DATA_TRANSFORMATION_ARTIFACTS_DIR,
                                                    PREPROCESSOR_OBJECT_FILE_NAME
                                                    )
+        self.FEATURE_ENCODER_FILE_PATH = os.path.join(from_root(),ARTIFACTS_DIR,
+                                                      DATA_TRANSFORMATION_ARTIFACTS_DIR,
+                                                      FEATURE_ENCODER_FILE_NAME
+                                                      )
         
 
 
@@ -72,6 +76,10 @@ class ModelTrainerConfig:
                                                          ARTIFACTS_DIR,
                                                          MODEL_TRAINER_ARTIFACTS_DIR,
                                                          MODEL_FILE_NAME)
+        self.MAPPED_MODEL_DIR :str = os.path.join(from_root(),
+                                                  ARTIFACTS_DIR,
+                                                  MODEL_TRAINER_ARTIFACTS_DIR,
+                                                  MAPPED_MODEL_DIR_NAME)
         
 
 
@@ -99,6 +107,7 @@ class ModelPusherConfig:
         )
         self.BUCKET_NAME: str = BUCKET_NAME
         self.S3_MODEL_KEY_PATH: str = os.path.join(S3_MODEL_NAME)
+        self.S3_MAPPED_MODEL_MANIFEST_KEY: str = S3_MAPPED_MODEL_MANIFEST_KEY
         
 
 
@@ -18,4 +18,32 @@ class ShippingException(Exception):
         self.error_message = error_message_detail(error_message, error_detail=error_detail)
 
     def __str__(self):
-        return self.error_message
\ No newline at end of file
+        return self.error_message
+
+class InferenceQueueFullException(Exception):
+    """Raised when the inference worker pool already has its maximum number of pending jobs."""
+
+
+class InferenceTimeoutException(Exception):
+    """Raised when an inference job does not finish within the configured timeout."""
+
+
+class ModelVersionNotFoundException(Exception):
+    """Raised when a pinned model version is not present in the s3 bucket."""
+
+
+class ExplanationNotSupportedException(Exception):
+    """Raised when the served model artifact cannot explain its predictions."""
+
+
+class AdmissionRejectedException(Exception):
+    """Raised when admission control sheds a request, with the status code and Retry-After seconds to answer with."""
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class ProfilerBusyException(Exception):
+    """Raised when a stack profile is requested while another one is being taken."""
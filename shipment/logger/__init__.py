@@ -1,17 +1,187 @@
-import logging 
+import atexit
+import json
+import logging
+import logging.handlers
 import os
+import queue
+import random
+import threading
 from datetime import datetime
+from typing import Dict, Optional
+from shipment.constant import (
+    LOG_DIR,
+    LOG_FORMAT,
+    LOG_LEVEL,
+    LOG_LEVELS,
+    LOG_QUEUE_MAX_SIZE,
+    LOG_SAMPLING_RATES,
+)
 
 LOG_FILE=f"{datetime.now().strftime('%m_%d_%Y_%H_%M_%S')}.log"
 
-logs_path=os.path.join(os.getcwd(),"logs",LOG_FILE)
-
-os.makedirs(logs_path,exist_ok=True)
+logs_path=os.path.join(os.getcwd(),LOG_DIR,LOG_FILE)
 
 LOG_FILE_PATH=os.path.join(logs_path,LOG_FILE)
 
-logging.basicConfig(
-    filename=LOG_FILE_PATH,
-    format="[ %(asctime)s ] %(lineno)d %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO
-)
+TEXT_FORMAT = "[ %(asctime)s ] %(lineno)d %(name)s - %(levelname)s - %(message)s"
+
+# Attributes every LogRecord has, anything else was passed through extra= and goes into the json record
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def parse_logger_settings(settings: str) -> Dict[str, str]:
+    """Parses comma separated logger=value pairs, as used by the level and sampling settings."""
+    pairs = {}
+    for item in settings.split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            pairs[name.strip()] = value.strip()
+    return pairs
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno,
+            "process": record.process,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exception"] = record.exc_text
+        return json.dumps(payload, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, float] = {}
+
+    def get_rate(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            # The closest configured ancestor applies, like logger levels
+            rate, prefix = 1.0, name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition(".")[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Warnings and errors are never sampled away
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.get_rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class LazyFileHandler(logging.FileHandler):
+    """File handler that creates the log directory together with the file, on the first record. Writes are
+    buffered until flush_buffer is called, the writer thread does so whenever the queue runs empty."""
+
+    def __init__(self, filename: str):
+        super().__init__(filename, delay=True)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+    def flush(self) -> None:
+        pass
+
+    def flush_buffer(self) -> None:
+        super().flush()
+
+
+class FlushingQueueListener(logging.handlers.QueueListener):
+    def dequeue(self, block: bool) -> logging.LogRecord:
+        if block and self.queue.empty():
+            for handler in self.handlers:
+                if isinstance(handler, LazyFileHandler):
+                    handler.flush_buffer()
+        return self.queue.get(block)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking the caller when the writer falls behind."""
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolving the message and traceback here keeps the record picklable and lets the writer format it.
+        # The root logger has no other handler, so the record is updated in place instead of copied.
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_configure_lock = threading.Lock()
+
+
+def configure_logging() -> None:
+
+    """
+    Method Name :   configure_logging
+
+    Description :   This function routes every record through a bounded queue to a background thread that
+                    writes them to the log file, so callers never wait on file writes. Levels and sampling
+                    rates can be set per logger. Calling it again has no effect.
+
+    Output      :   Root logger is configured
+    """
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            return
+
+        file_handler = LazyFileHandler(LOG_FILE_PATH)
+        file_handler.setFormatter(
+            JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+        )
+
+        queue_handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_MAX_SIZE))
+        rates = {name: float(rate) for name, rate in parse_logger_settings(LOG_SAMPLING_RATES).items()}
+        if rates:
+            queue_handler.addFilter(SamplingFilter(rates))
+
+        root = logging.getLogger()
+        root.addHandler(queue_handler)
+        root.setLevel(LOG_LEVEL.upper())
+        for name, level in parse_logger_settings(LOG_LEVELS).items():
+            logging.getLogger(name).setLevel(level.upper())
+
+        _listener = FlushingQueueListener(
+            queue_handler.queue, file_handler, respect_handler_level=True
+        )
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Returns the named logger, so its level and sampling rate can be set on their own."""
+    configure_logging()
+    return logging.getLogger(name)
+
+
+configure_logging()
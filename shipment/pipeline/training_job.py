@@ -0,0 +1,308 @@
+import fcntl
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, IO, Iterator, Optional, Tuple
+from shipment.constant import *
+from shipment.logger import logging
+
+
+TRAINING_STAGES = [
+    "data_ingestion",
+    "data_validation",
+    "data_transformation",
+    "model_trainer",
+    "model_evaluation",
+    "model_pusher",
+]
+
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+# Held for the whole run by the worker that started it, the OS drops it if that worker dies
+RUN_LOCK_FILE = "run.lock"
+# Held briefly while a job is started or its state is checked
+STATE_LOCK_FILE = "state.lock"
+CURRENT_JOB_FILE = "current"
+
+
+def _run_training_pipeline(events, niceness: int) -> None:
+    # Runs in the child process, so the training stack is only imported there
+    try:
+        if niceness:
+            os.nice(niceness)
+
+        from shipment.pipeline.training_pipeline import TrainPipeline
+
+        train_pipeline = TrainPipeline()
+        train_pipeline.run_pipeline(
+            progress_callback=lambda stage, status: events.put(("stage", stage, status))
+        )
+        events.put(("done", None, None))
+
+    except Exception as e:
+        events.put(("failed", None, f"{e}"))
+
+
+class TrainingJob:
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.status = JOB_RUNNING
+        self.stages: Dict[str, str] = {stage: "pending" for stage in TRAINING_STAGES}
+        self.current_stage: Optional[str] = None
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self.status == JOB_RUNNING
+
+    def to_dict(self) -> Dict:
+        completed = sum(status in ("completed", "skipped") for status in self.stages.values())
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "current_stage": self.current_stage,
+            "stages": dict(self.stages),
+            "progress": completed / len(self.stages),
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict) -> "TrainingJob":
+        job = cls(state["job_id"])
+        job.status = state["status"]
+        job.stages = dict(state["stages"])
+        job.current_stage = state["current_stage"]
+        job.error = state["error"]
+        job.started_at = state["started_at"]
+        job.finished_at = state["finished_at"]
+        return job
+
+
+class TrainingJobRunner:
+    def __init__(
+        self,
+        on_success: Callable[[], None] = None,
+        niceness: int = TRAINING_JOB_NICENESS,
+        max_history: int = TRAINING_JOB_HISTORY,
+        job_dir: str = TRAINING_JOB_DIR,
+    ):
+        # Only called in the worker that ran the job, the other workers pick up the new model when they
+        # revalidate its ETag
+        self.on_success = on_success
+        self.niceness = niceness
+        self.max_history = max_history
+        # Job files and locks shared by every worker, so a run is single-flight across uvicorn workers
+        self.job_dir = job_dir
+        self._context = multiprocessing.get_context("spawn")
+
+    @contextmanager
+    def _state_lock(self) -> Iterator[None]:
+        os.makedirs(self.job_dir, exist_ok=True)
+        with open(os.path.join(self.job_dir, STATE_LOCK_FILE), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _try_run_lock(self) -> Optional[IO]:
+        # flock conflicts between open files, so this also fails for another thread of the same worker
+        lock_file = open(os.path.join(self.job_dir, RUN_LOCK_FILE), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    @staticmethod
+    def _release_run_lock(lock_file: IO) -> None:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+    def _get_job_path(self, job_id: str) -> str:
+        return os.path.join(self.job_dir, f"{job_id}.json")
+
+    def _write_atomic(self, path: str, content: str) -> None:
+        # Readers in other workers see the old file or the complete new one, never a partial one
+        fd, tmp_path = tempfile.mkstemp(dir=self.job_dir, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w") as file_obj:
+                file_obj.write(content)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _save(self, job: TrainingJob) -> None:
+        self._write_atomic(self._get_job_path(job.job_id), json.dumps(job.to_dict()))
+
+    def _read(self, job_id: str) -> Optional[TrainingJob]:
+        # Job ids are uuid hex digests, anything else cannot name a job file
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self._get_job_path(job_id)) as file_obj:
+                return TrainingJob.from_dict(json.load(file_obj))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _read_current(self) -> Optional[TrainingJob]:
+        try:
+            with open(os.path.join(self.job_dir, CURRENT_JOB_FILE)) as file_obj:
+                job_id = file_obj.read().strip()
+        except OSError:
+            return None
+        return self._read(job_id)
+
+    def _fail_abandoned(self, job: Optional[TrainingJob]) -> None:
+        # Called with the state lock and the run lock held, so no worker is running the job any more
+        if job is not None and job.is_running:
+            job.status = JOB_FAILED
+            job.error = "Training job was abandoned by the worker that ran it"
+            job.finished_at = time.time()
+            self._save(job)
+            logging.error(f"Training job {job.job_id} was abandoned by the worker that ran it")
+
+    def _prune_history(self, keep: str) -> None:
+        job_files = sorted(
+            (entry for entry in os.scandir(self.job_dir) if entry.name.endswith(".json")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in job_files[:max(0, len(job_files) - self.max_history)]:
+            if entry.name != f"{keep}.json":
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def submit(self) -> Tuple[TrainingJob, bool]:
+
+        """
+        Method Name :   submit
+
+        Description :   This method starts the training pipeline in a separate process. If a run is already in
+                        flight in any worker on the host, the trigger joins it instead of starting a second
+                        one. The run lock is held by the worker that started the run until it finishes.
+
+        Output      :   Tuple of the training job and whether the trigger joined an existing run
+        """
+        with self._state_lock():
+            run_lock = self._try_run_lock()
+            if run_lock is None:
+                job = self._read_current()
+                if job is None:
+                    raise RuntimeError(f"A training run holds the lock in {self.job_dir} but left no job state")
+                logging.info(f"Training job {job.job_id} is already running, joining it")
+                return job, True
+
+            try:
+                self._fail_abandoned(self._read_current())
+
+                job = TrainingJob(uuid.uuid4().hex)
+                events = self._context.Queue()
+                process = self._context.Process(
+                    target=_run_training_pipeline,
+                    args=(events, self.niceness),
+                    name=f"training-{job.job_id}",
+                )
+                process.start()
+
+                self._save(job)
+                self._write_atomic(os.path.join(self.job_dir, CURRENT_JOB_FILE), job.job_id)
+                self._prune_history(keep=job.job_id)
+
+            except BaseException:
+                self._release_run_lock(run_lock)
+                raise
+
+        threading.Thread(
+            target=self._monitor, args=(job, process, events, run_lock), daemon=True
+        ).start()
+        logging.info(f"Started training job {job.job_id} in process {process.pid}")
+        return job, False
+
+    def get(self, job_id: str) -> Optional[TrainingJob]:
+
+        """
+        Method Name :   get
+
+        Description :   This method reads the state of a training job, whichever worker runs it. A job still
+                        marked running while no worker holds the run lock is marked failed.
+
+        Output      :   Training job, or None if it is unknown
+        """
+        job = self._read(job_id)
+        if job is None or not job.is_running:
+            return job
+
+        with self._state_lock():
+            run_lock = self._try_run_lock()
+            if run_lock is None:
+                return self._read(job_id)
+            try:
+                job = self._read(job_id)
+                self._fail_abandoned(job)
+                return job
+            finally:
+                self._release_run_lock(run_lock)
+
+    @property
+    def current(self) -> Optional[TrainingJob]:
+        return self._read_current()
+
+    def _monitor(self, job: TrainingJob, process, events, run_lock: IO) -> None:
+        try:
+            while True:
+                try:
+                    kind, stage, detail = events.get(timeout=1)
+                except Exception:
+                    if not process.is_alive():
+                        job.status = JOB_FAILED
+                        job.error = f"Training process exited with code {process.exitcode}"
+                        break
+                    continue
+
+                if kind == "stage":
+                    job.stages[stage] = detail
+                    job.current_stage = stage
+                    self._save(job)
+                elif kind == "done":
+                    job.status = JOB_SUCCEEDED
+                    break
+                else:
+                    job.status = JOB_FAILED
+                    job.error = detail
+                    if job.current_stage is not None:
+                        job.stages[job.current_stage] = "failed"
+                    break
+
+            process.join()
+            job.finished_at = time.time()
+            self._save(job)
+
+        finally:
+            # The final state is written before the lock is released, so the next trigger never sees it running
+            self._release_run_lock(run_lock)
+
+        logging.info(f"Training job {job.job_id} finished with status {job.status}")
+
+        if job.status == JOB_SUCCEEDED and self.on_success is not None:
+            try:
+                self.on_success()
+            except Exception as e:
+                logging.error(f"Post-training callback failed: {e}")
@@ -1,4 +1,5 @@
 import sys
+from typing import Callable, Optional
 from shipment.exception import ShippingException
 from shipment.logger import logging
 from shipment.configuration.mongo_operations import MongoDBOperation
@@ -155,29 +156,48 @@ class TrainPipeline:
             raise ShippingException(e, sys) from e
 
 
-    def run_pipeline(self) -> None:
+    def run_pipeline(self, progress_callback: Optional[Callable[[str, str], None]] = None) -> None:
         logging.info("Entered the run_pipeline method of TrainPipeline class")
         try:
+            # progress_callback is called with (stage, "started" | "completed" | "skipped")
+            report = progress_callback if progress_callback is not None else lambda stage, status: None
+
+            report("data_ingestion", "started")
             data_ingestion_artifact = self.start_data_ingestion()
+            report("data_ingestion", "completed")
+
+            report("data_validation", "started")
             data_validation_artifact = self.start_data_validation(data_ingestion_artifact=data_ingestion_artifact)
+            report("data_validation", "completed")
+
+            report("data_transformation", "started")
             data_transformation_artifact = self.start_data_transformation(data_ingestion_artifact=data_ingestion_artifact)
+            report("data_transformation", "completed")
+
+            report("model_trainer", "started")
             model_trainer_artifact = self.start_model_trainer(data_transformation_artifact=data_transformation_artifact)
+            report("model_trainer", "completed")
             
+            report("model_evaluation", "started")
             model_evaluation_artifact = self.start_model_evaluation(
                 data_ingestion_artifact=data_ingestion_artifact,
                 model_trainer_artifact=model_trainer_artifact
             )
+            report("model_evaluation", "completed")
 
             if not model_evaluation_artifact.is_model_accepted:
                 logging.info("Model not Accepted.")
+                report("model_pusher", "skipped")
                 return None 
 
 
+            report("model_pusher", "started")
             model_pusher_artifact = self.start_model_pusher(
                 model_trainer_artifacts=model_trainer_artifact,
                 s3=self.s3_operations,
                 data_transformation_artifacts=data_transformation_artifact,
             )
+            report("model_pusher", "completed")
 
 
             logging.info("Exited the run_pipeline method of TrainPipeline class.")
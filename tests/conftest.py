@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.microbench import fit_models, load_training_frame  # noqa: E402
+
+# Rows of data/train.csv the stand-in models are fitted on, enough for trees of the configured depth
+FIT_ROWS = 2000
+
+
+@pytest.fixture(scope="session")
+def training_frame():
+    data = load_training_frame(os.path.join(ROOT_DIR, "data", "train.csv"))
+    return data.drop(columns=["Cost"]), data["Cost"]
+
+
+@pytest.fixture(scope="session")
+def cost_models(training_frame):
+    # One CostModel per model family of config/model.yaml, fitted like the micro-benchmarks do
+    X, y = training_frame
+    return fit_models(X.iloc[:FIT_ROWS], y.iloc[:FIT_ROWS], seed=0)
@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+from starlette.responses import JSONResponse
+
+from shipment.components.admission_controller import (
+    AdmissionController,
+    AdmissionLimiter,
+    AdmissionMiddleware,
+)
+from shipment.exception import AdmissionRejectedException
+
+
+def test_limiter_queues_sheds_and_hands_over_slots():
+    async def run():
+        limiter = AdmissionLimiter("POST /predict", max_concurrency=1, max_queue=1, deadline=5)
+        admitted_at = await limiter.acquire()
+
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.queue_depth == 1
+
+        with pytest.raises(AdmissionRejectedException) as rejected:
+            await limiter.acquire()
+        assert rejected.value.status_code == 429
+
+        # The slot goes straight to the queued request
+        limiter.release(admitted_at)
+        limiter.release(await waiter)
+        assert (limiter.in_flight, limiter.queue_depth) == (0, 0)
+
+    asyncio.run(run())
+
+
+def test_limiter_sheds_requests_past_the_deadline():
+    async def run():
+        limiter = AdmissionLimiter("POST /predict", max_concurrency=1, max_queue=1, deadline=0.01)
+        admitted_at = await limiter.acquire()
+
+        with pytest.raises(AdmissionRejectedException) as rejected:
+            await limiter.acquire()
+        assert rejected.value.status_code == 503
+        assert limiter.queue_depth == 0
+
+        limiter.release(admitted_at)
+        assert limiter.in_flight == 0
+
+    asyncio.run(run())
+
+
+def make_middleware(app):
+    controller = AdmissionController("POST /predict=1:0:1")
+    middleware = AdmissionMiddleware(
+        app, controller, lambda e: JSONResponse({"error": f"{e}"}, status_code=e.status_code)
+    )
+    return controller.limiters["POST /predict"], middleware
+
+
+async def call(middleware, method="POST", path="/predict"):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await middleware({"type": "http", "method": method, "path": path, "headers": []}, receive, send)
+    return sent
+
+
+def test_middleware_holds_the_slot_until_the_last_body_message():
+    async def run():
+        streaming = asyncio.Event()
+        finish = asyncio.Event()
+
+        async def app(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"a", "more_body": True})
+            streaming.set()
+            await finish.wait()
+            await send({"type": "http.response.body", "body": b"b", "more_body": False})
+
+        limiter, middleware = make_middleware(app)
+        task = asyncio.create_task(call(middleware))
+        await streaming.wait()
+        assert limiter.in_flight == 1
+
+        finish.set()
+        await task
+        assert limiter.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_middleware_releases_the_slot_when_the_response_never_starts():
+    async def run():
+        async def app(scope, receive, send):
+            raise RuntimeError("failed before the response")
+
+        limiter, middleware = make_middleware(app)
+        with pytest.raises(RuntimeError):
+            await call(middleware)
+        assert limiter.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_middleware_sheds_requests_with_the_reject_response():
+    async def run():
+        entered = asyncio.Event()
+        finish = asyncio.Event()
+
+        async def app(scope, receive, send):
+            entered.set()
+            await finish.wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+        limiter, middleware = make_middleware(app)
+        task = asyncio.create_task(call(middleware))
+        await entered.wait()
+
+        sent = await call(middleware)
+        assert sent[0]["status"] == 429
+
+        finish.set()
+        await task
+        assert limiter.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_middleware_passes_unlimited_routes_through():
+    async def run():
+        paths = []
+
+        async def app(scope, receive, send):
+            paths.append(scope["path"])
+
+        limiter, middleware = make_middleware(app)
+        await call(middleware, method="GET")
+        assert paths == ["/predict"] and limiter.in_flight == 0
+
+    asyncio.run(run())
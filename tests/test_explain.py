@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize("model_name", ["RandomForestRegressor", "XGBRegressor"])
+def test_explained_predictions_match_plain_predictions(cost_models, training_frame, model_name):
+    model = cost_models[model_name]
+    X = training_frame[0].iloc[:2000]
+
+    explanation = model.explain(X)
+
+    np.testing.assert_array_equal(explanation.predictions, model.predict(X))
+    np.testing.assert_allclose(
+        explanation.base_values + explanation.contributions.sum(axis=1), explanation.predictions, rtol=1e-6
+    )
+
+
+@pytest.mark.parametrize("model_name", ["RandomForestRegressor", "XGBRegressor"])
+def test_explained_records_match_plain_records(cost_models, training_frame, model_name):
+    model = cost_models[model_name]
+    records = training_frame[0].iloc[:200].to_dict("records")
+
+    explanation = model.explain_records(records)
+
+    np.testing.assert_array_equal(explanation.predictions, model.predict_records(records))
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from shipment.components.data_transformation import DataTransformation
+from shipment.components.feature_encoder import FeatureEncoder
+from shipment.entity.config_entity import DataTransformationConfig
+
+
+@pytest.fixture(scope="module")
+def preprocessor_and_encoder(training_frame):
+    # The OneHotEncoder, BinaryEncoder and StandardScaler of the training pipeline
+    preprocessor = DataTransformation.get_data_transformer_object(DataTransformationConfig())
+    preprocessor.fit(training_frame[0])
+    return preprocessor, FeatureEncoder.from_preprocessor(preprocessor)
+
+
+def get_expected(preprocessor, X):
+    expected = preprocessor.transform(X)
+    return expected.toarray() if hasattr(expected, "toarray") else expected
+
+
+def test_transform_frame_matches_preprocessor(preprocessor_and_encoder, training_frame):
+    preprocessor, encoder = preprocessor_and_encoder
+    X = training_frame[0]
+
+    np.testing.assert_array_equal(encoder.transform_frame(X), get_expected(preprocessor, X))
+
+
+def test_transform_records_matches_preprocessor(preprocessor_and_encoder, training_frame):
+    preprocessor, encoder = preprocessor_and_encoder
+    X = training_frame[0].iloc[:1000]
+
+    np.testing.assert_array_equal(
+        encoder.transform_records(X.to_dict(orient="records")), get_expected(preprocessor, X)
+    )
+
+
+def test_transform_encoded_matches_preprocessor(preprocessor_and_encoder, training_frame):
+    preprocessor, encoder = preprocessor_and_encoder
+    X = training_frame[0].iloc[:1000]
+
+    categorical = {block.column: pd.factorize(X[block.column]) for block in encoder.blocks}
+    numeric = {column: X[column].to_numpy() for column in encoder.numeric_columns}
+
+    np.testing.assert_array_equal(
+        encoder.transform_encoded(categorical, numeric, len(X)), get_expected(preprocessor, X)
+    )
+
+
+@pytest.mark.parametrize(("column", "value"), [("Material", "Unobtainium"), ("International", "Maybe")])
+def test_unknown_category_is_rejected_like_the_preprocessor(preprocessor_and_encoder, training_frame, column, value):
+    preprocessor, encoder = preprocessor_and_encoder
+    X = training_frame[0].iloc[:3].copy()
+    X.loc[X.index[0], column] = value
+
+    with pytest.raises(ValueError):
+        preprocessor.transform(X)
+    with pytest.raises(ValueError):
+        encoder.transform_frame(X)
+    with pytest.raises(ValueError):
+        encoder.transform_records(X.to_dict(orient="records"))
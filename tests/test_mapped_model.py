@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from shipment.components.mapped_model import MappedCostModel
+from shipment.exception import ExplanationNotSupportedException
+
+
+@pytest.fixture(scope="module")
+def mapped_models(cost_models, tmp_path_factory):
+    # Saved and loaded again, so the predictions come from the memory-mapped arrays
+    mapped_models = {}
+    for model_name, model in cost_models.items():
+        model_dir = str(tmp_path_factory.mktemp(model_name))
+        MappedCostModel.from_cost_model(model).save(model_dir)
+        mapped_models[model_name] = MappedCostModel.load(model_dir)
+    return mapped_models
+
+
+@pytest.mark.parametrize("model_name", ["RandomForestRegressor", "XGBRegressor"])
+def test_mapped_predictions_match_native_predictions(cost_models, mapped_models, training_frame, model_name):
+    X = training_frame[0]
+
+    np.testing.assert_allclose(
+        mapped_models[model_name].predict(X), cost_models[model_name].predict(X), rtol=1e-5, atol=1e-6
+    )
+
+
+@pytest.mark.parametrize("model_name", ["RandomForestRegressor", "XGBRegressor"])
+def test_mapped_records_match_native_records(cost_models, mapped_models, training_frame, model_name):
+    records = training_frame[0].iloc[:500].to_dict("records")
+
+    np.testing.assert_allclose(
+        mapped_models[model_name].predict_records(records),
+        cost_models[model_name].predict_records(records),
+        rtol=1e-5,
+        atol=1e-6,
+    )
+
+
+def test_mapped_model_rejects_explanations(mapped_models, training_frame):
+    X = training_frame[0].iloc[:10]
+
+    with pytest.raises(ExplanationNotSupportedException):
+        mapped_models["XGBRegressor"].explain(X)
+    with pytest.raises(ExplanationNotSupportedException):
+        mapped_models["XGBRegressor"].explain_records(X.to_dict("records"))
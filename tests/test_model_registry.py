@@ -0,0 +1,61 @@
+import pytest
+
+from shipment.components.model_registry import ModelRegistry
+from shipment.exception import ModelVersionNotFoundException
+
+
+class FakeS3:
+    def __init__(self, versions):
+        self.versions = versions
+        self.list_calls = 0
+
+    def get_object_versions(self, model_name, bucket_name):
+        self.list_calls += 1
+        return self.versions
+
+    def load_model_with_etag(self, model_name, bucket_name, version_id=None):
+        return object(), '"etag-1"'
+
+
+@pytest.fixture
+def s3():
+    return FakeS3([{"VersionId": "v1", "ETag": '"etag-1"', "Size": 1024}])
+
+
+def test_missing_version_is_not_listed_again_within_ttl(s3):
+    registry = ModelRegistry(s3=s3, artifact_format="pickle", missing_ttl=60)
+
+    for _ in range(3):
+        with pytest.raises(ModelVersionNotFoundException):
+            registry.get_model("v-unknown")
+
+    assert s3.list_calls == 1
+
+
+def test_missing_version_is_listed_again_after_ttl(s3):
+    registry = ModelRegistry(s3=s3, artifact_format="pickle", missing_ttl=0)
+
+    for _ in range(2):
+        with pytest.raises(ModelVersionNotFoundException):
+            registry.get_model("v-unknown")
+
+    assert s3.list_calls == 2
+
+
+def test_missing_version_does_not_wait_for_loads(s3):
+    registry = ModelRegistry(s3=s3, artifact_format="pickle")
+
+    # A load of another version holding the lock must not hold up the answer for an unknown version
+    with registry._load_lock:
+        with pytest.raises(ModelVersionNotFoundException):
+            registry.get_model("v-unknown")
+
+
+def test_known_version_is_loaded_once(s3):
+    registry = ModelRegistry(s3=s3, artifact_format="pickle")
+
+    model = registry.get_model("v1")
+
+    assert registry.get_model("v1") is model
+    assert registry.get_model('"etag-1"') is model
+    assert s3.list_calls == 1
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from shipment.components.prediction_cache import PredictionCache
+
+RECORD = {"Artist Reputation": 0.5, "Material": "Brass"}
+
+
+class SlowCompute:
+    def __init__(self, value=100.0, error=None):
+        self.value = value
+        self.error = error
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+def test_concurrent_requests_share_one_computation():
+    async def run():
+        cache = PredictionCache(max_size=10, ttl=60)
+        compute = SlowCompute()
+
+        requests = [asyncio.create_task(cache.get_or_compute(RECORD, "v1", compute)) for _ in range(5)]
+        await asyncio.sleep(0)
+        compute.release.set()
+
+        assert await asyncio.gather(*requests) == [100.0] * 5
+        assert compute.calls == 1
+        # Served from the cache afterwards
+        assert await cache.get_or_compute(RECORD, "v1", compute) == 100.0
+        assert compute.calls == 1
+
+    asyncio.run(run())
+
+
+def test_cancelled_originator_does_not_cancel_coalesced_requests():
+    async def run():
+        cache = PredictionCache(max_size=10, ttl=60)
+        compute = SlowCompute()
+
+        originator = asyncio.create_task(cache.get_or_compute(RECORD, "v1", compute))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_or_compute(RECORD, "v1", compute))
+        await asyncio.sleep(0)
+
+        originator.cancel()
+        await asyncio.sleep(0)
+        compute.release.set()
+
+        assert await waiter == 100.0
+        assert originator.cancelled()
+        assert compute.calls == 1
+
+    asyncio.run(run())
+
+
+def test_failed_computation_fails_every_coalesced_request_and_is_not_cached():
+    async def run():
+        cache = PredictionCache(max_size=10, ttl=60)
+        compute = SlowCompute(error=ValueError("scoring failed"))
+
+        requests = [asyncio.create_task(cache.get_or_compute(RECORD, "v1", compute)) for _ in range(3)]
+        await asyncio.sleep(0)
+        compute.release.set()
+
+        results = await asyncio.gather(*requests, return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+
+        with pytest.raises(ValueError):
+            await cache.get_or_compute(RECORD, "v1", compute)
+        assert compute.calls == 2
+
+    asyncio.run(run())
+
+
+def test_model_version_change_clears_the_cache():
+    async def run():
+        cache = PredictionCache(max_size=10, ttl=60)
+        compute = SlowCompute()
+        compute.release.set()
+
+        await cache.get_or_compute(RECORD, "v1", compute)
+        await cache.get_or_compute(RECORD, "v2", compute)
+
+        assert compute.calls == 2
+
+    asyncio.run(run())
@@ -0,0 +1,71 @@
+import json
+import os
+import time
+
+import pytest
+
+from shipment.pipeline import training_job
+from shipment.pipeline.training_job import JOB_FAILED, JOB_RUNNING, JOB_SUCCEEDED, TrainingJobRunner
+
+RELEASE_ENV = "TEST_TRAINING_RELEASE_FILE"
+
+
+def fake_training_pipeline(events, niceness):
+    # Stands in for the training pipeline in the spawned process, finishing once the test creates the file
+    events.put(("stage", "data_ingestion", "completed"))
+    while not os.path.exists(os.environ[RELEASE_ENV]):
+        time.sleep(0.05)
+    events.put(("done", None, None))
+
+
+def wait_for(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def release_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(training_job, "_run_training_pipeline", fake_training_pipeline)
+    release_file = tmp_path / "release"
+    monkeypatch.setenv(RELEASE_ENV, str(release_file))
+    return release_file
+
+
+def test_workers_share_one_training_run(tmp_path, release_file):
+    job_dir = str(tmp_path / "jobs")
+    reloads = []
+    # Two runners stand in for two uvicorn workers sharing the job directory
+    first = TrainingJobRunner(on_success=lambda: reloads.append(True), niceness=0, job_dir=job_dir)
+    second = TrainingJobRunner(niceness=0, job_dir=job_dir)
+
+    job, joined = first.submit()
+    assert not joined
+
+    joined_job, joined = second.submit()
+    assert joined and joined_job.job_id == job.job_id
+    assert second.get(job.job_id).status == JOB_RUNNING
+
+    release_file.touch()
+    wait_for(lambda: second.get(job.job_id).status == JOB_SUCCEEDED)
+    wait_for(lambda: reloads == [True])
+
+    # The run lock is free again, so the next trigger starts a new run
+    next_job, joined = second.submit()
+    assert not joined and next_job.job_id != job.job_id
+    wait_for(lambda: second.get(next_job.job_id).status == JOB_SUCCEEDED)
+
+
+def test_job_left_running_by_a_dead_worker_is_failed(tmp_path):
+    job_dir = tmp_path / "jobs"
+    job_dir.mkdir()
+    job = training_job.TrainingJob("abandoned")
+    (job_dir / "abandoned.json").write_text(json.dumps(job.to_dict()))
+    (job_dir / training_job.CURRENT_JOB_FILE).write_text("abandoned")
+
+    runner = TrainingJobRunner(job_dir=str(job_dir))
+
+    assert runner.get("abandoned").status == JOB_FAILED
+    assert runner.get("unknown") is None
+    assert runner.get("../abandoned") is None
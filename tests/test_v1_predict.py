@@ -0,0 +1,49 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+# app.py mounts static/ and reads templates/ relative to the working directory
+os.chdir(ROOT_DIR)
+
+import app as serving_app  # noqa: E402
+from shipment.components.model_predictor import shippingData  # noqa: E402
+from shipment.components.request_validator import ShipmentValidatorCache  # noqa: E402
+
+
+@pytest.fixture
+def shipment_and_client(monkeypatch):
+    # The first complete row of the training data, with the categories of its columns standing in for the
+    # model's encoder, so the request is validated without loading a model
+    data = pd.read_csv(os.path.join(ROOT_DIR, "data", "train.csv"))
+    row = data.dropna(subset=list(shippingData.FIELD_COLUMNS.values())).iloc[0]
+    shipment = {field: row[column] for field, column in shippingData.FIELD_COLUMNS.items()}
+    shipment = {field: value.item() if hasattr(value, "item") else value for field, value in shipment.items()}
+    domains = {
+        column: {"categories": [str(c) for c in data[column].dropna().unique()], "nullable": False}
+        for column in shippingData.FIELD_COLUMNS.values()
+        if data[column].dtype == object
+    }
+
+    async def load_domains(pinned_version):
+        return domains
+
+    monkeypatch.setattr(serving_app, "shipment_validators", ShipmentValidatorCache(load_domains))
+    monkeypatch.setattr(serving_app.cost_predictor.model_holder, "get_version", lambda: "test-version")
+    return shipment, TestClient(serving_app.app)
+
+
+def test_v1_predict_rejects_null_numerical_field(shipment_and_client):
+    shipment, client = shipment_and_client
+    shipment["weight"] = None
+
+    response = client.post("/v1/predict", json=shipment)
+
+    assert response.status_code == 422
+    assert response.json()["detail"] == [
+        {"loc": ["body", "weight"], "msg": "may not be null", "type": "value_error"}
+    ]